@@ -5,6 +5,7 @@ from itertools import combinations
 import yaml
 from matplotlib.patches import Rectangle
 from shapely.geometry import Point, Polygon, MultiPolygon
+from physical_env.network.SetCover import DisjointSetCover
 
 # Đọc dữ liệu từ tệp YAML
 with open('D:\Code\Python\BaoCaoNghienCuu\WRSN\physical_env\\network\\network_scenarios\hanoi1000n50.yaml', 'r') as file:
@@ -145,17 +146,7 @@ def remove_duplicate_sets(set):
     Returns:
         list: Danh sách các tập hợp con không trùng lặp.
     """
-    different = False
-    new_arr = []
-    new_arr.append(set[0])
-    for i in range(1, len(set)):
-        different = False
-        for arr in new_arr:
-            if set[i] == arr:
-                different = True
-        if not different:
-            new_arr.append(set[i])
-    return new_arr
+    return [sorted(group) for group in DisjointSetCover.unique(set)]
 
 def find_and_add_isolated_circle(arr_nodes, nodes):
     """
@@ -168,18 +159,13 @@ def find_and_add_isolated_circle(arr_nodes, nodes):
     Returns:
         None
     """
-    merge_arr_node = []
+    merge_arr_node = set()
     for arr_node in arr_nodes:
-        for node in arr_node:
-            merge_arr_node.append(node)
+        merge_arr_node.update(arr_node)
 
-    arr_node_isolated = []
     for i in range(len(nodes)):
-        arr_node_isolated = []
         if i not in merge_arr_node:
-            arr_node_isolated.append(i)
-        if (len(arr_node_isolated) == 1):
-            arr_nodes.append(arr_node_isolated)
+            arr_nodes.append([i])
 
 def remove_common_elements(arr, nodes):
     """
@@ -192,18 +178,7 @@ def remove_common_elements(arr, nodes):
     Returns:
         list: Tập hợp các tập con không chứa phần tử chung.
     """
-    for i in range(len(arr)-2):
-        arr = sorted(arr, key=lambda x: len(x), reverse=True)
-        first_subarray = arr[i]
-        for num in first_subarray:
-            for subarray in arr[(i+1):]:
-                if num in subarray:
-                    subarray.remove(num)
-        arr = sorted(arr, key=lambda x: len(x), reverse=True)
-    arr = [subarray for subarray in arr if subarray]
-
-    find_and_add_isolated_circle(arr, nodes)
-    return arr
+    return DisjointSetCover(arr).partition(len(nodes))
 
 def draw_sensor_icon(ax, x, y, icon_path, icon_size):
     """
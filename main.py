@@ -13,7 +13,9 @@ from scipy.spatial import distance
 import pandas as pd
 from physical_env.mc.MobileCharger import MobileCharger
 from physical_env.network.NetworkIO import NetworkIO
-from optimizer.q_learning_heuristic import Q_learning
+from optimizer.q_learning_heuristic import Q_learning, DEFAULT_CHECKPOINT
+from optimizer.parallel_trainer import ParallelTrainer
+from optimizer.fleet_dispatcher import FleetDispatcher
 import sys
 import os
 import time
@@ -91,41 +93,41 @@ def print_state_net(net, mcs):
         else:
             print("\t\tMC energy:{} is {} at {} state:{}".format(mc.energy, mc.get_status(), mc.current, mc.state))
 
-# def train_q_learning(q_learning, episodes=100):
-#     for episode in range(episodes):
-#         # Khởi tạo môi trường và agent (MC)
-#         env, net = networkIO.makeNetwork()
-#         mcs = [MobileCharger(copy.deepcopy(net.baseStation.location), mc_phy_spe=mc_argc) for _ in range(1)]
-#         for id, mc in enumerate(mcs):
-#             mc.env = env
-#             mc.net = net
-#             mc.id = id
-#             mc.cur_phy_action = [net.baseStation.location[0], net.baseStation.location[1], 0]
-#         net.mc_list = mcs
-
-#         # Huấn luyện trong một episode
-#         x = env.process(net.operate(optimizer=q_  learning))
-#         env.run(until=x)
-
-#         # Lưu bảng Q sau mỗi episode
-#         np.save(f'q_table_episode_{episode}.npy', q_learning.q_table)
-
-networkIO = NetworkIO("physical_env/network/network_scenarios/hanoi1000n50.yaml")
-env, net = networkIO.makeNetwork()
-
-with open("physical_env\mc\mc_types\default.yaml", 'r') as file:
-    mc_argc = yaml.safe_load(file)
-mcs = [MobileCharger(copy.deepcopy(net.baseStation.location), mc_phy_spe=mc_argc) for _ in range(1)]
-print(mc for mc in mcs)
-for id, mc in enumerate(mcs):
-    mc.env = env
-    mc.net = net
-    mc.id = id
-    mc.cur_phy_action = [net.baseStation.location[0], net.baseStation.location[1], 0]
-q_learning = Q_learning(net=net, nb_action=31, alpha=0.1, q_gamma=0.1, epsilon=0)
-# train_q_learning(q_learning, episodes=100)
-print("start network simulation")
-net.mc_list = mcs
-x = env.process(net.operate(optimizer=q_learning))
-env.process(log(net, mcs, q_learning))
-env.run(until=x)
+def train_q_learning(q_learning, episodes=100, scenario="physical_env/network/network_scenarios/hanoi1000n50.yaml",
+                     nb_workers=None, mode="sync", checkpoint=DEFAULT_CHECKPOINT):
+    # Huấn luyện song song nhiều episode, tiếp tục từ checkpoint nếu có và lưu lại checkpoint sau khi học
+    trainer = ParallelTrainer(scenario, nb_workers=nb_workers, mode=mode, save_dir=".",
+                              q_params=dict(alpha=q_learning.alpha, q_alpha=q_learning.q_alpha,
+                                            q_gamma=q_learning.q_gamma, epsilon=q_learning.epsilon))
+    trainer.train(episodes=episodes, checkpoint=checkpoint)
+    trained = trainer.to_q_learning()
+    q_learning.q_table = trained.q_table
+    q_learning.action_list = trained.action_list
+    q_learning.layout = trained.layout
+    return q_learning
+
+if __name__ == "__main__":
+    networkIO = NetworkIO("physical_env/network/network_scenarios/hanoi1000n50.yaml")
+    env, net = networkIO.makeNetwork()
+
+    with open("physical_env\mc\mc_types\default.yaml", 'r') as file:
+        mc_argc = yaml.safe_load(file)
+    # Nhiều MC thì các MC rảnh được ghép với các cụm cần sạc cùng lúc bởi FleetDispatcher
+    nb_mc = 1
+    mcs = [MobileCharger(copy.deepcopy(net.baseStation.location), mc_phy_spe=mc_argc) for _ in range(nb_mc)]
+    print(mc for mc in mcs)
+    for id, mc in enumerate(mcs):
+        mc.env = env
+        mc.net = net
+        mc.id = id
+        mc.cur_phy_action = [net.baseStation.location[0], net.baseStation.location[1], 0]
+    q_learning = Q_learning(net=net, nb_action=31, alpha=0.1, q_gamma=0.1, epsilon=0)
+    # train_q_learning(q_learning, episodes=100)
+    # Dùng lại bảng Q đã học: Q_learning(..., load_checkpoint=DEFAULT_CHECKPOINT, scenario=<đường dẫn kịch bản>)
+    print("start network simulation")
+    net.mc_list = mcs
+    optimizer = FleetDispatcher(q_learning) if nb_mc > 1 else q_learning
+    x = env.process(net.operate(optimizer=optimizer))
+    env.process(log(net, mcs, q_learning))
+    env.run(until=x)
+    print("[Optimizer] Reward cache: {}".format(q_learning.reward_cache.stats()))
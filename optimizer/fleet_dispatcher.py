@@ -0,0 +1,209 @@
+import random
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from optimizer.utils import q_max_function
+
+
+class FleetDispatcher:
+    """
+    Điều phối nhiều MC dùng chung một bảng Q. Ở mỗi thời điểm quyết định, bảng Q được cập nhật cho mọi MC
+    đang rảnh (như Q_learning.update), sau đó các MC rảnh được ghép với các vị trí sạc trong một lần bằng
+    thuật toán Hungary (linear_sum_assignment) sao cho tổng giá trị Q lớn nhất; như choose_next_state, với
+    xác suất optimizer.epsilon mỗi MC được gán trước một vị trí hợp lệ ngẫu nhiên. Vị trí mà MC khác đang tới
+    hoặc đang sạc bị loại, nên hai MC không đuổi theo cùng một cụm. Các MC khác quyết định ở cùng thời điểm
+    nhận luôn kết quả đã ghép; MC đang đứng chờ yêu cầu mới được đánh thức (Network.signal_request) để nhận
+    kết quả ngay ở thời điểm này, nên chỉ các MC thực sự quyết định mới được cập nhật bảng Q và được ghép.
+
+    Dispatcher có cùng giao diện với Q_learning (list_request, action_list, layout, update) nên có thể
+    truyền vào Network.operate thay cho bộ tối ưu; danh sách MC được lấy từ network.mc_list.
+
+    Args:
+        optimizer (Q_learning): Bộ tối ưu cung cấp bảng Q, phần thưởng và thời gian sạc.
+        energy_rest (float): MC có năng lượng dưới mức này được đưa về trạm cơ sở.
+
+    Attributes:
+        assignments (dict): Kết quả ghép của thời điểm quyết định gần nhất (id MC -> (trạng thái, thời gian sạc)).
+        updated (set): Các MC đã được cập nhật bảng Q ở thời điểm quyết định gần nhất.
+        epoch (float): Thời điểm của lần ghép gần nhất.
+    """
+
+    def __init__(self, optimizer, energy_rest=540):
+        self.optimizer = optimizer
+        self.energy_rest = energy_rest
+        self.assignments = {}
+        self.updated = set()
+        self.epoch = None
+
+    @property
+    def list_request(self):
+        return self.optimizer.list_request
+
+    @list_request.setter
+    def list_request(self, list_request):
+        self.optimizer.list_request = list_request
+
+    @property
+    def action_list(self):
+        return self.optimizer.action_list
+
+    @action_list.setter
+    def action_list(self, action_list):
+        self.optimizer.action_list = action_list
+        self.assignments = {}
+
+    @property
+    def layout(self):
+        return getattr(self.optimizer, "layout", None)
+
+    def is_idle(self, mc, now):
+        """
+        Kiểm tra MC có cần quyết định tại thời điểm now hay không.
+
+        Args:
+            mc (object): Đối tượng MC.
+            now (float): Thời điểm hiện tại.
+
+        Returns:
+            bool: True nếu MC đang rảnh hoặc đã hết hành động hiện tại.
+        """
+        return self.is_parked(mc) or mc.end_time <= now + 10 ** -9
+
+    @staticmethod
+    def is_parked(mc):
+        """
+        Kiểm tra MC có đang đứng chờ yêu cầu sạc mới (chỉ thức dậy khi có Network.signal_request) hay không.
+
+        Args:
+            mc (object): Đối tượng MC.
+
+        Returns:
+            bool: True nếu MC không có hành động nào đang chờ kết thúc.
+        """
+        return not mc.is_active or not mc.decision_pending
+
+    def learn(self, mc, network, time_stem, q_max_func=q_max_function):
+        """
+        Cập nhật hàng mc.state của bảng Q với phần thưởng hiện tại (như Q_learning.update).
+
+        Args:
+            mc (object): Đối tượng MC.
+            network (object): Đối tượng mạng.
+            time_stem (float): Thời gian.
+            q_max_func (function): Hàm tính giá trị Q lớn nhất.
+
+        Returns:
+            numpy.ndarray: Thời gian sạc dự kiến tại từng vị trí sạc.
+        """
+        q_learning = self.optimizer
+        q_learning.set_reward(mc=mc, time_stem=time_stem, network=network)
+        q_learning.q_table[mc.state] = (1 - q_learning.q_alpha) * q_learning.q_table[mc.state] + q_learning.q_alpha * (
+            q_learning.reward + q_learning.q_gamma * q_learning.q_max(mc, q_max_func))
+        return np.asarray(q_learning.charging_time, dtype=float)
+
+    def assign(self, network, mcs, time_stem, taken=(), deciding=None, q_max_func=q_max_function):
+        """
+        Ghép các MC rảnh với các vị trí sạc trong một lần.
+
+        Args:
+            network (object): Đối tượng mạng.
+            mcs (list): Các MC rảnh (năng lượng đủ để làm việc).
+            time_stem (float): Thời điểm quyết định.
+            taken (iterable): Các trạng thái đã được ghép cho MC khác nhưng chưa được nhận.
+            deciding (list): Các MC đang quyết định tại time_stem, được cập nhật bảng Q trước khi ghép;
+                mặc định là mọi MC trong mcs. Các MC còn lại (đang đứng chờ) chỉ được cập nhật khi nhận kết quả.
+            q_max_func (function): Hàm tính giá trị Q lớn nhất.
+
+        Returns:
+            dict: id MC -> (trạng thái, thời gian sạc) cho các MC được ghép.
+        """
+        if not mcs:
+            return {}
+        rest = len(self.action_list) - 1
+        deciding = mcs if deciding is None else deciding
+        charging = []
+        for mc in mcs:
+            if mc.id not in self.updated and mc in deciding:
+                self.updated.add(mc.id)
+                charging.append(self.learn(mc, network, time_stem, q_max_func))
+            else:
+                charging.append(np.asarray(self.optimizer.get_charging_times(network, mc, time_stem,
+                                                                             self.optimizer.alpha)))
+        values = np.asarray(self.optimizer.q_table, dtype=float)[[mc.state for mc in mcs]]
+        allowed = np.isfinite(values)
+        allowed[:, rest] = False
+        allowed[:, list(taken)] = False
+        for other in network.mc_list:
+            if other not in mcs and other.state < rest:
+                allowed[:, other.state] = False
+        epsilon = getattr(self.optimizer, "epsilon", 0)
+        for row, mc in enumerate(mcs):
+            # Khám phá epsilon-greedy theo từng MC: gán trước một vị trí hợp lệ ngẫu nhiên cho MC này.
+            if epsilon > 0 and random.uniform(0, 1) < epsilon:
+                choices = np.flatnonzero(allowed[row])
+                if len(choices):
+                    col = int(choices[random.randrange(len(choices))])
+                    allowed[:, col] = False
+                    allowed[row] = False
+                    allowed[row, col] = True
+                    print('[Optimizer] MC {} randomly chooses next state {} due to epsilon-greedy policy.'.format(
+                        mc.id, col))
+        if not np.any(allowed):
+            return {}
+        finite = values[allowed]
+        # Ô bị loại nhận chi phí lớn hơn mọi cách ghép hợp lệ và bị bỏ sau khi ghép.
+        cost = np.where(allowed, -values, np.max(-finite) + (np.ptp(finite) + 1) * (len(mcs) + 1))
+        rows, cols = linear_sum_assignment(cost)
+        return {mcs[row].id: (int(col), float(charging[row][col]))
+                for row, col in zip(rows, cols) if allowed[row, col]}
+
+    def update(self, mc, network, time_stem, alpha=0.5, gamma=0.5, q_max_func=q_max_function):
+        """
+        Chọn hành động tiếp theo cho MC. Nếu MC chưa có kết quả ghép ở thời điểm này, mọi MC rảnh
+        được ghép lại cùng lúc.
+
+        Args:
+            mc (object): Đối tượng MC.
+            network (object): Đối tượng mạng.
+            time_stem (float): Thời gian.
+            q_max_func (function): Hàm tính giá trị Q lớn nhất khi cập nhật bảng Q.
+
+        Returns:
+            tuple: Bao gồm vị trí được chọn và thời gian sạc.
+        """
+        if not self.list_request:
+            return self.action_list[mc.state], 0
+        rest = len(self.action_list) - 1
+        if mc.energy < self.energy_rest:
+            mc.state = rest
+            print('[Optimizer] MC {} energy is running low ({:.2f}), and needs to rest!'.format(mc.id, mc.energy))
+            return self.action_list[rest], 0
+        if self.epoch != time_stem:
+            self.assignments = {}
+            self.updated = set()
+            self.epoch = time_stem
+        if mc.id not in self.assignments:
+            idle = [other for other in network.mc_list if (other is mc or self.is_idle(other, time_stem))
+                    and other.id not in self.assignments and other.energy >= self.energy_rest]
+            # MC đứng chờ chỉ quyết định ở thời điểm này nếu vừa có lần đánh thức (Network.signal_request).
+            woken = getattr(network, "request_time", None) == time_stem
+            deciding = [other for other in idle if other is mc or woken or not self.is_parked(other)]
+            taken = [state for state, _ in self.assignments.values()]
+            self.assignments.update(self.assign(network, idle, time_stem, taken, deciding, q_max_func))
+            # MC đứng chờ chỉ thức dậy khi có yêu cầu mới: đánh thức các MC vừa được ghép để chúng nhận
+            # kết quả ngay thời điểm này. MC đứng chờ không được ghép thì không bị đánh thức.
+            if any(other not in deciding and other.id in self.assignments for other in idle):
+                network.signal_request()
+        assignment = self.assignments.pop(mc.id, None)
+        if assignment is None:
+            # Mọi vị trí sạc đều đã có MC khác nhận: MC đứng chờ tại vị trí hiện tại.
+            return self.action_list[mc.state], 0
+        if mc.id not in self.updated:
+            # MC đứng chờ được đánh thức: cập nhật bảng Q khi nó thực sự quyết định.
+            self.updated.add(mc.id)
+            self.learn(mc, network, time_stem, q_max_func)
+        mc.state, charging_time = assignment
+        print("[Optimizer] MC {} is sent to point {} (id={}) and charge for {:.2f}s".format(
+            mc.id, self.action_list[mc.state], mc.state, charging_time))
+        return self.action_list[mc.state], charging_time
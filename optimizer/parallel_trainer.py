@@ -0,0 +1,277 @@
+import contextlib
+import copy
+import multiprocessing
+import os
+import random
+from multiprocessing import shared_memory
+
+import numpy as np
+import yaml
+
+from physical_env.mc.MobileCharger import MobileCharger
+from physical_env.network.NetworkIO import NetworkIO
+from optimizer.q_learning_heuristic import Q_learning
+
+DEFAULT_MC_TYPE = os.path.join("physical_env", "mc", "mc_types", "default.yaml")
+
+
+def load_mc_type(mc_type=DEFAULT_MC_TYPE):
+    """
+    Đọc thông số vật lý của MC.
+
+    Args:
+        mc_type (str): Đường dẫn tệp YAML mô tả MC.
+
+    Returns:
+        dict: Thông số của MC.
+    """
+    with open(mc_type, 'r') as file:
+        return yaml.safe_load(file)
+
+
+def make_episode(scenario, mc_argc, nb_mc=1, seed=None, energy_mode="discrete"):
+    """
+    Tạo môi trường, mạng và các MC cho một episode.
+
+    Args:
+        scenario (str): Đường dẫn kịch bản mạng.
+        mc_argc (dict): Thông số vật lý của MC.
+        nb_mc (int): Số lượng MC.
+        seed (int): Seed riêng của episode; None thì giữ seed của kịch bản.
+        energy_mode (str): Mô hình năng lượng của mạng ("discrete" hoặc "analytic").
+
+    Returns:
+        tuple: Môi trường simpy và mạng (đã gắn các MC).
+    """
+    env, net = NetworkIO(scenario).makeNetwork(energy_mode=energy_mode)
+    # makeNetwork đặt lại seed theo kịch bản, nên seed của episode phải được đặt sau đó.
+    if seed is not None:
+        np.random.seed(seed)
+        random.seed(seed)
+    mcs = [MobileCharger(copy.deepcopy(net.baseStation.location), mc_phy_spe=mc_argc) for _ in range(nb_mc)]
+    for id, mc in enumerate(mcs):
+        mc.env = env
+        mc.net = net
+        mc.id = id
+        mc.cur_phy_action = [net.baseStation.location[0], net.baseStation.location[1], 0]
+    net.mc_list = mcs
+    return env, net
+
+
+def find_layout(scenario, seed=None, energy_mode="discrete"):
+    """
+    Chạy mạng tới lúc phân cụm xong để lấy danh sách vị trí sạc dùng chung cho mọi episode.
+
+    Args:
+        scenario (str): Đường dẫn kịch bản mạng.
+        seed (int): Seed của lần chạy.
+        energy_mode (str): Mô hình năng lượng của mạng.
+
+    Returns:
+        ClusterLayout: Kết quả phân cụm của mạng.
+    """
+    env, net = make_episode(scenario, load_mc_type(), nb_mc=0, seed=seed, energy_mode=energy_mode)
+    q_learning = Q_learning(net=net)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        env.process(net.operate(optimizer=q_learning))
+        while net.cluster_layout is None:
+            env.step()
+    return net.cluster_layout
+
+
+def run_episode(q_learning, scenario, mc_argc, until=None, seed=None, layout=None, nb_mc=1,
+                energy_mode="discrete"):
+    """
+    Chạy một episode huấn luyện, bảng Q của q_learning được cập nhật tại chỗ.
+
+    Args:
+        q_learning (Q_learning): Tác tử Q-learning.
+        scenario (str): Đường dẫn kịch bản mạng.
+        mc_argc (dict): Thông số vật lý của MC.
+        until (float): Thời gian mô phỏng tối đa; None thì chạy tới khi mạng chết.
+        seed (int): Seed riêng của episode.
+        layout (ClusterLayout): Vị trí sạc cố định; None thì mạng tự phân cụm.
+        nb_mc (int): Số lượng MC.
+        energy_mode (str): Mô hình năng lượng của mạng.
+
+    Returns:
+        Network: Mạng sau khi kết thúc episode (thời điểm kết thúc là net.env.now).
+    """
+    env, net = make_episode(scenario, mc_argc, nb_mc=nb_mc, seed=seed, energy_mode=energy_mode)
+    if layout is not None:
+        net.set_cluster_layout(layout)
+        # Cùng số hành động thì bảng Q đã học được giữ nguyên.
+        q_learning.action_list = net.network_cluster
+    q_learning.list_request = []
+    process = env.process(net.operate(optimizer=q_learning))
+    env.run(until=process if until is None else env.any_of([process, env.timeout(until)]))
+    return net
+
+
+_worker = {}
+
+
+def _init_worker(shm_name, shape, lock, config):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker["shm"] = shm
+    _worker["q_table"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _worker["lock"] = lock
+    _worker["config"] = config
+    _worker["mc_argc"] = load_mc_type(config["mc_type"])
+
+
+def _run_task(task):
+    episode, seed, asynchronous = task
+    config = _worker["config"]
+    shared = _worker["q_table"]
+    lock = _worker["lock"]
+    q_learning = Q_learning(nb_action=shared.shape[0] - 1, **config["q_params"])
+    with lock:
+        start = shared.copy()
+    q_learning.q_table = start.copy()
+
+    stream = open(os.devnull, 'w') if config["quiet"] else None
+    with contextlib.ExitStack() as stack:
+        if stream is not None:
+            stack.enter_context(stream)
+            stack.enter_context(contextlib.redirect_stdout(stream))
+        run_episode(q_learning, config["scenario"], _worker["mc_argc"], until=config["until"], seed=seed,
+                    layout=config["layout"], nb_mc=config["nb_mc"], energy_mode=config["energy_mode"])
+
+    q_table = q_learning.q_table
+    if asynchronous:
+        with lock:
+            merge_update(shared, [(start, q_table)])
+        return episode, None
+    return episode, (start, q_table)
+
+
+def merge_update(shared, updates):
+    """
+    Cộng trung bình phần thay đổi của các episode vào bảng Q dùng chung.
+    Các ô không hữu hạn (q_max_function đặt -inf cho trạng thái hiện tại) được chép thẳng.
+
+    Args:
+        shared (numpy.ndarray): Bảng Q dùng chung.
+        updates (list): Các cặp (bảng Q lúc bắt đầu, bảng Q lúc kết thúc) của từng episode.
+    """
+    deltas = []
+    for start, q_table in updates:
+        finite = np.isfinite(start) & np.isfinite(q_table)
+        deltas.append(np.where(finite, q_table - np.where(finite, start, 0), 0))
+    shared += np.mean(deltas, axis=0)
+    for _, q_table in updates:
+        fixed = ~np.isfinite(q_table)
+        shared[fixed] = q_table[fixed]
+
+
+class ParallelTrainer:
+    """
+    Huấn luyện Q-learning với nhiều episode chạy song song trên một process pool.
+    Bảng Q dùng chung nằm trong shared memory. Mỗi episode bắt đầu từ bản sao của bảng Q dùng chung,
+    có seed riêng, và đóng góp phần thay đổi của nó vào bảng Q dùng chung:
+        - "sync": các episode chạy theo từng vòng (mỗi worker một episode), sau mỗi vòng bảng Q
+          dùng chung được cộng trung bình các phần thay đổi;
+        - "async": mỗi episode cộng ngay phần thay đổi của nó khi kết thúc (có khóa).
+    Mọi episode dùng chung một danh sách vị trí sạc để các bảng Q có cùng ý nghĩa.
+
+    Args:
+        scenario (str): Đường dẫn kịch bản mạng.
+        mc_type (str): Đường dẫn tệp YAML mô tả MC.
+        nb_workers (int): Số tiến trình; mặc định là số lõi CPU.
+        mode (str): Cách gộp cập nhật, "sync" hoặc "async".
+        until (float): Thời gian mô phỏng tối đa của mỗi episode; None thì chạy tới khi mạng chết.
+        seed (int): Seed gốc, seed của từng episode được sinh từ seed này.
+        q_params (dict): Tham số khởi tạo Q_learning (alpha, q_alpha, q_gamma, epsilon).
+        nb_mc (int): Số lượng MC.
+        energy_mode (str): Mô hình năng lượng của mạng.
+        save_dir (str): Thư mục lưu bảng Q sau mỗi vòng/episode (q_table_episode_{n}.npy); None thì không lưu.
+        quiet (bool): Tắt log của mô phỏng trong các worker.
+    """
+
+    def __init__(self, scenario, mc_type=DEFAULT_MC_TYPE, nb_workers=None, mode="sync", until=None, seed=0,
+                 q_params=None, nb_mc=1, energy_mode="discrete", save_dir=None, quiet=True):
+        if mode not in ("sync", "async"):
+            raise ValueError("mode must be 'sync' or 'async', got {!r}".format(mode))
+        self.scenario = scenario
+        self.mc_type = mc_type
+        self.nb_workers = nb_workers or os.cpu_count() or 1
+        self.mode = mode
+        self.until = until
+        self.seed = seed
+        self.q_params = dict(q_params or {})
+        self.nb_mc = nb_mc
+        self.energy_mode = energy_mode
+        self.save_dir = save_dir
+        self.quiet = quiet
+        self.layout = None
+        self.q_table = None
+
+    def _config(self):
+        return {"scenario": self.scenario, "mc_type": self.mc_type, "until": self.until, "q_params": self.q_params,
+                "layout": self.layout, "nb_mc": self.nb_mc, "energy_mode": self.energy_mode, "quiet": self.quiet}
+
+    def _save(self, shared, episode):
+        if self.save_dir is None:
+            return
+        os.makedirs(self.save_dir, exist_ok=True)
+        np.save(os.path.join(self.save_dir, 'q_table_episode_{}.npy'.format(episode)), shared)
+
+    def train(self, episodes=100, q_table=None, checkpoint=None):
+        """
+        Huấn luyện trong `episodes` episode.
+
+        Args:
+            episodes (int): Tổng số episode.
+            q_table (numpy.ndarray): Bảng Q khởi đầu; None thì bắt đầu từ bảng 0.
+            checkpoint (str): Thư mục checkpoint để tiếp tục huấn luyện (bảng Q và vị trí sạc).
+
+        Returns:
+            numpy.ndarray: Bảng Q sau khi huấn luyện.
+        """
+        if checkpoint is not None and os.path.exists(os.path.join(checkpoint, "meta.json")):
+            q_learning = Q_learning(load_checkpoint=checkpoint, scenario=self.scenario)
+            if q_learning.layout is not None:
+                self.layout = q_learning.layout
+                q_table = np.asarray(q_learning.q_table) if q_table is None else q_table
+        if self.layout is None:
+            self.layout = find_layout(self.scenario, seed=self.seed, energy_mode=self.energy_mode)
+        nb_action = len(self.layout.charging_pos)
+        seeds = [int(s.generate_state(1)[0]) for s in np.random.SeedSequence(self.seed).spawn(episodes)]
+
+        shm = shared_memory.SharedMemory(create=True, size=nb_action * nb_action * 8)
+        try:
+            shared = np.ndarray((nb_action, nb_action), dtype=np.float64, buffer=shm.buf)
+            shared[:] = 0 if q_table is None else q_table
+            lock = multiprocessing.Lock()
+            with multiprocessing.Pool(self.nb_workers, initializer=_init_worker,
+                                      initargs=(shm.name, shared.shape, lock, self._config())) as pool:
+                if self.mode == "async":
+                    tasks = [(episode, seeds[episode], True) for episode in range(episodes)]
+                    for episode, _ in pool.imap_unordered(_run_task, tasks):
+                        with lock:
+                            self._save(shared, episode)
+                else:
+                    for start in range(0, episodes, self.nb_workers):
+                        tasks = [(episode, seeds[episode], False)
+                                 for episode in range(start, min(start + self.nb_workers, episodes))]
+                        merge_update(shared, [update for _, update in pool.map(_run_task, tasks)])
+                        self._save(shared, tasks[-1][0])
+            self.q_table = shared.copy()
+        finally:
+            shm.close()
+            shm.unlink()
+        if checkpoint is not None:
+            self.to_q_learning().save_checkpoint(checkpoint, scenario=self.scenario)
+        return self.q_table
+
+    def to_q_learning(self):
+        """
+        Returns:
+            Q_learning: Tác tử mang bảng Q đã huấn luyện cùng các vị trí sạc của nó.
+        """
+        q_learning = Q_learning(nb_action=len(self.layout.charging_pos) - 1, **self.q_params)
+        q_learning.action_list = list(self.layout.charging_pos)
+        q_learning.q_table = self.q_table
+        q_learning.layout = self.layout
+        return q_learning
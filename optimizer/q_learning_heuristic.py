@@ -1,8 +1,34 @@
+import json
+import os
 import random
 import numpy as np
 from scipy.spatial import distance
-from optimizer.utils import init_function, q_max_function, reward_function, network_clustering_v2
+from optimizer.utils import init_function, q_max_function, batch_reward_function, network_clustering_v2, \
+    get_charging_times, PathIncidence, RewardCache
+from optimizer import parameter as para
+from optimizer.request_queue import RequestQueue
 from physical_env.network import Node
+from physical_env.network.utils import ClusterLayout
+from physical_env.network.ScenarioCache import ScenarioCache
+
+CHECKPOINT_VERSION = 1
+DEFAULT_CHECKPOINT = os.path.join("checkpoints", "q_learning")
+
+
+def scenario_identity(scenario):
+    """
+    Định danh của một kịch bản mạng, được ghi vào checkpoint để không tải nhầm bảng Q và các cụm sang mạng khác.
+
+    Args:
+        scenario (str): Đường dẫn tệp kịch bản YAML.
+
+    Returns:
+        dict: Tên tệp, mã SHA-1 của tệp và số lượng nút.
+    """
+    net_argc = ScenarioCache().load(scenario)
+    return {"path": os.path.basename(scenario), "hash": ScenarioCache.file_hash(scenario),
+            "nb_nodes": int(len(net_argc["nodes"]))}
+
 
 class Q_learning:
     """
@@ -15,37 +41,52 @@ class Q_learning:
         q_alpha (float): Trọng số cho việc cập nhật giá trị Q.
         q_gamma (float): Hệ số chiết khấu cho các phần thưởng tương lai.
         epsilon (float): Tỷ lệ khám phá.
-        load_checkpoint (bool): Có nên tải dữ liệu kiểm tra không.
+        load_checkpoint (bool | str): Tải bảng Q đã học từ checkpoint (True dùng DEFAULT_CHECKPOINT,
+            hoặc đường dẫn thư mục checkpoint). Các siêu tham số truyền vào hàm khởi tạo được giữ nguyên.
+        scenario (str): Kịch bản mạng mà checkpoint phải khớp khi tải (xem load_checkpoint).
         net (object): Đối tượng mạng.
+        reward_tolerance (float): Sai lệch tương đối của năng lượng các nút được coi là không đổi khi dùng lại
+            phần thưởng đã tính (None thì không dùng bộ nhớ đệm phần thưởng).
+        reward_cache_size (int): Số kết quả phần thưởng tối đa được giữ trong bộ nhớ đệm.
 
     Attributes:
         action_list (numpy.ndarray): Mảng các hành động có thể thực hiện.
         nb_action (int): Số lượng hành động.
         q_table (numpy.ndarray): Bảng Q để lưu trữ các giá trị Q.
+        action_distance (numpy.ndarray): Ma trận khoảng cách giữa các vị trí sạc và các nút.
+        action_rate (numpy.ndarray): Ma trận công suất sạc giữa các vị trí sạc và các nút.
         charging_time (list): Danh sách thời gian sạc cho mỗi hành động.
         reward (numpy.ndarray): Mảng các phần thưởng cho mỗi hành động.
         reward_max (list): Danh sách các phần thưởng tối đa cho mỗi hành động.
-        list_request (list): Danh sách yêu cầu.
+        list_request (RequestQueue): Hàng đợi yêu cầu sạc (gán một danh sách dict sẽ được chuyển thành hàng đợi).
         alpha (float): Tỉ lệ học.
         q_alpha (float): Trọng số cho việc cập nhật giá trị Q.
         q_gamma (float): Hệ số chiết khấu cho các phần thưởng tương lai.
         epsilon (float): Tỷ lệ khám phá.
+        layout (ClusterLayout): Các cụm ứng với action_list nếu được tải từ checkpoint.
+        scenario (dict): Định danh kịch bản của checkpoint đã tải (xem scenario_identity), None nếu không rõ.
+        reward_cache (RewardCache): Bộ nhớ đệm phần thưởng của các quyết định gần đây.
 
     Methods:
-        reset_q_table(): Đặt lại bảng Q.
+        reset_q_table(nb_action=None): Đặt lại bảng Q (bỏ bảng đã học).
         update_v2(mc, network, time_stem, alpha=0.5, gamma=0.5, q_max_func=q_max_function): Cập nhật bảng Q và chọn hành động tiếp theo.
         update(mc, network, time_stem, alpha=0.5, gamma=0.5, q_max_func=q_max_function): Cập nhật bảng Q và chọn hành động tiếp theo.
         q_max(mc, q_max_func=q_max_function): Tính toán giá trị Q lớn nhất.
         set_reward(mc=None, time_stem=0, network=None): Đặt các phần thưởng cho mỗi hành động.
         choose_next_state(mc, network): Chọn trạng thái tiếp theo dựa trên giá trị Q.
         choose_next_state_v2(mc, network): Chọn trạng thái tiếp theo dựa trên chính sách epsilon-greedy.
+        save_checkpoint(path, layout=None, scenario=None): Lưu bảng Q, danh sách hành động, siêu tham số và kịch bản.
+        load_checkpoint(path, mmap_mode='c', scenario=None, restore_hparams=False): Tải bảng Q và danh sách hành động.
     """
 
     def __init__(self, init_func=init_function, nb_action=31, alpha=0.5, q_alpha=0.1, q_gamma=0.01, 
-                 epsilon=0, load_checkpoint=False, net=None):
-        self.action_list = np.zeros(nb_action + 1)
+                 epsilon=0, load_checkpoint=False, net=None, reward_tolerance=None, reward_cache_size=64,
+                 scenario=None):
         self.nb_action = nb_action + 1
-        self.q_table = init_func(nb_action=nb_action + 1)
+        self.init_func = init_func
+        self.reward_cache = RewardCache(maxsize=reward_cache_size, tolerance=reward_tolerance)
+        self.init_q_table(nb_action + 1)
+        self.action_list = np.zeros(nb_action + 1)
         self.charging_time = [0.0 for _ in range(nb_action + 1)]
         self.reward = np.asarray([0.0 for _ in range(nb_action + 1)])
         self.reward_max = [0.0 for _ in range(nb_action + 1)]
@@ -54,12 +95,229 @@ class Q_learning:
         self.q_alpha = q_alpha
         self.q_gamma = q_gamma
         self.epsilon = epsilon
+        self.path_incidence = None
+        self.layout = None
+        self.scenario = None
+        if load_checkpoint:
+            self.load_checkpoint(DEFAULT_CHECKPOINT if load_checkpoint is True else load_checkpoint,
+                                 scenario=scenario)
     
-    def reset_q_table(self):
+    @property
+    def list_request(self):
+        return self._list_request
+
+    @list_request.setter
+    def list_request(self, list_request):
+        if not isinstance(list_request, RequestQueue):
+            list_request = RequestQueue(list_request)
+        self._list_request = list_request
+
+    @property
+    def action_list(self):
+        return self._action_list
+
+    @action_list.setter
+    def action_list(self, action_list):
+        """
+        Gán danh sách vị trí sạc mới. Ma trận khoảng cách và ma trận công suất sạc giữa các vị trí
+        sạc và các nút chỉ được tính lại sau khi gán. Nếu số hành động thay đổi, bảng Q mới khởi tạo
+        được tạo lại với kích thước mới; bảng Q do người gọi gán hoặc đã học có đúng kích thước mới
+        được giữ nguyên, còn nếu sai kích thước thì báo lỗi thay vì âm thầm bỏ đi.
+
+        Args:
+            action_list (list): Danh sách tọa độ các vị trí sạc (vị trí cuối cùng là trạm cơ sở).
+
+        Raises:
+            ValueError: Bảng Q không phải bảng mới khởi tạo và không khớp số hành động mới.
+        """
+        nb_action = len(action_list)
+        resized = nb_action != self.nb_action
+        initial = resized and self.q_table_is_initial()
+        if resized and not initial and np.shape(self.q_table) != (nb_action, nb_action):
+            raise ValueError("Q-table of shape {} does not fit {} actions; call reset_q_table() to discard "
+                             "it".format(np.shape(self.q_table), nb_action))
+        self._action_list = action_list
+        self.action_positions = None
+        self.action_distance = None
+        self.action_rate = None
+        self._matrix_network = None
+        self._charging_key = None
+        self.reward_cache.clear()
+        if resized:
+            if initial:
+                self.init_q_table(nb_action)
+            self.resize(nb_action)
+
+    def resize(self, nb_action):
+        """
+        Đặt số hành động và cấp lại các mảng theo hành động (thời gian sạc, phần thưởng) với kích thước mới.
+
+        Args:
+            nb_action (int): Số lượng hành động.
+        """
+        self.nb_action = nb_action
+        self.charging_time = [0.0 for _ in range(self.nb_action)]
+        self.reward = np.asarray([0.0 for _ in range(self.nb_action)])
+        self.reward_max = [0.0 for _ in range(self.nb_action)]
+
+    def get_action_matrices(self, network):
+        """
+        Lấy ma trận khoảng cách và ma trận công suất sạc para.alpha / (d + para.beta) ** 2
+        giữa các vị trí sạc và các nút của mạng (kích thước hành động x nút).
+
+        Args:
+            network (object): Đối tượng mạng.
+
+        Returns:
+            tuple: Ma trận khoảng cách và ma trận công suất sạc.
+        """
+        if self.action_distance is None or self._matrix_network is not network:
+            actions = np.asarray([tuple(action) for action in self._action_list], dtype=float).reshape(-1, 2)
+            self.action_positions = actions
+            self.action_distance = distance.cdist(actions, network.state.location)
+            self.action_rate = para.alpha / (self.action_distance + para.beta) ** 2
+            self._matrix_network = network
+        return self.action_distance, self.action_rate
+
+    def get_charging_times(self, network, mc, time_stem, alpha):
+        """
+        Lấy thời gian sạc dự kiến của MC tại mọi vị trí sạc. Các giá trị được tính một lần cho mỗi
+        quyết định (cùng mạng, MC, thời điểm và alpha) và dùng lại cho mọi trạng thái.
+
+        Args:
+            network (object): Đối tượng mạng.
+            mc (object): Đối tượng MC.
+            time_stem (int): Thời gian.
+            alpha (float): Tham số điều chỉnh.
+
+        Returns:
+            numpy.ndarray: Thời gian sạc dự kiến tại từng vị trí sạc.
+        """
+        key = (id(network), id(mc), time_stem, alpha)
+        if self._charging_key != key:
+            _, action_rate = self.get_action_matrices(network)
+            self.charging_times = get_charging_times(network, mc, self.action_positions, action_rate, alpha=alpha)
+            self._charging_key = key
+        return self.charging_times
+
+    def get_path_incidence(self, network):
+        """
+        Lấy cấu trúc đường đi về trạm cơ sở của mạng, chỉ tính lại khi cây định tuyến thay đổi.
+
+        Args:
+            network (object): Đối tượng mạng.
+
+        Returns:
+            PathIncidence: Cấu trúc đường đi của mạng.
+        """
+        incidence = self.path_incidence
+        if incidence is None or incidence.network is not network or \
+                incidence.version != network.get_routing().version:
+            incidence = PathIncidence(network)
+            self.path_incidence = incidence
+        return incidence
+
+    def save_checkpoint(self, path=DEFAULT_CHECKPOINT, layout=None, scenario=None):
+        """
+        Lưu checkpoint vào thư mục `path`: q_table.npy, action_list.npy và meta.json (phiên bản định dạng,
+        siêu tham số, các cụm và kịch bản). meta.json được ghi sau cùng nên checkpoint chỉ hợp lệ khi đã ghi đủ.
+
+        Args:
+            path (str): Thư mục checkpoint.
+            layout (ClusterLayout): Các cụm ứng với action_list; mặc định là self.layout.
+            scenario (str): Đường dẫn kịch bản mà bảng Q và các cụm thuộc về; mặc định là kịch bản của
+                checkpoint đã tải (self.scenario).
         """
-        Đặt lại bảng Q.
+        layout = layout if layout is not None else self.layout
+        identity = scenario_identity(scenario) if scenario is not None else self.scenario
+        os.makedirs(path, exist_ok=True)
+        arrays = {"q_table.npy": np.asarray(self.q_table, dtype=float),
+                  "action_list.npy": np.asarray([tuple(action) for action in self.action_list], dtype=float)}
+        for name, array in arrays.items():
+            tmp = os.path.join(path, name + ".tmp")
+            with open(tmp, 'wb') as file:
+                np.save(file, array)
+            os.replace(tmp, os.path.join(path, name))
+        meta = {"version": CHECKPOINT_VERSION, "nb_action": self.nb_action, "alpha": self.alpha,
+                "q_alpha": self.q_alpha, "q_gamma": self.q_gamma, "epsilon": self.epsilon,
+                "members": None if layout is None else [[int(i) for i in centers] for centers in layout.members],
+                "scenario": identity}
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, 'w') as file:
+            json.dump(meta, file)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+
+    def load_checkpoint(self, path=DEFAULT_CHECKPOINT, mmap_mode='c', scenario=None, restore_hparams=False):
+        """
+        Tải checkpoint đã lưu bằng save_checkpoint. Bảng Q được ánh xạ bộ nhớ (mặc định copy-on-write,
+        cập nhật bảng Q không ghi ngược vào tệp).
+
+        Args:
+            path (str): Thư mục checkpoint.
+            mmap_mode (str): Chế độ np.load; None để đọc toàn bộ vào bộ nhớ.
+            scenario (str): Kịch bản mạng sẽ dùng checkpoint; nếu có, checkpoint phải được lưu cho đúng kịch bản
+                này (cùng mã băm và số nút), nếu không sẽ báo lỗi.
+            restore_hparams (bool): Ghi đè alpha, q_alpha, q_gamma, epsilon bằng giá trị trong checkpoint;
+                mặc định giữ các giá trị hiện tại (ví dụ epsilon=0 khi đánh giá).
+        """
+        with open(os.path.join(path, "meta.json"), 'r') as file:
+            meta = json.load(file)
+        if meta.get("version") != CHECKPOINT_VERSION:
+            raise ValueError("Unsupported checkpoint version {!r} in {}".format(meta.get("version"), path))
+        saved = meta.get("scenario")
+        if scenario is not None:
+            expected = scenario_identity(scenario)
+            if saved is None:
+                raise ValueError("Checkpoint {} does not record its scenario, cannot use it for {}".format(
+                    path, expected["path"]))
+            if saved.get("hash") != expected["hash"] or saved.get("nb_nodes") != expected["nb_nodes"]:
+                raise ValueError("Checkpoint {} was saved for scenario {} ({} nodes), not {} ({} nodes)".format(
+                    path, saved.get("path"), saved.get("nb_nodes"), expected["path"], expected["nb_nodes"]))
+        q_table = np.load(os.path.join(path, "q_table.npy"), mmap_mode=mmap_mode)
+        action_list = [tuple(action) for action in np.load(os.path.join(path, "action_list.npy")).tolist()]
+        if q_table.shape != (len(action_list), len(action_list)):
+            raise ValueError("Checkpoint {} has a {} Q-table for {} actions".format(path, q_table.shape,
+                                                                                     len(action_list)))
+        self.q_table = q_table
+        self.action_list = action_list
+        if restore_hparams:
+            self.alpha = meta["alpha"]
+            self.q_alpha = meta["q_alpha"]
+            self.q_gamma = meta["q_gamma"]
+            self.epsilon = meta["epsilon"]
+        self.scenario = saved
+        if meta.get("members") is not None:
+            self.layout = ClusterLayout.from_parts(action_list, meta["members"])
+
+    def init_q_table(self, nb_action):
+        """
+        Tạo bảng Q mới bằng init_func và ghi nhớ nó là bảng mới khởi tạo (xem q_table_is_initial).
+
+        Args:
+            nb_action (int): Số lượng hành động.
+        """
+        self.q_table = self.init_func(nb_action=nb_action)
+        self._initial_q_table = (self.q_table, np.array(self.q_table, copy=True))
+
+    def q_table_is_initial(self):
+        """
+        Returns:
+            bool: True nếu bảng Q vẫn là bảng do init_func tạo ra, chưa được người gọi thay thế hay học.
+        """
+        table, values = self._initial_q_table
+        return self.q_table is table and np.array_equal(self.q_table, values)
+
+    def reset_q_table(self, nb_action=None):
+        """
+        Đặt lại bảng Q (bỏ bảng hiện tại, kể cả bảng đã học).
+
+        Args:
+            nb_action (int): Số lượng hành động, mặc định giữ số hiện tại.
         """
-        self.q_table = init_function(nb_action=self.nb_action)
+        nb_action = self.nb_action if nb_action is None else nb_action
+        self.init_q_table(nb_action)
+        if nb_action != self.nb_action:
+            self.resize(nb_action)
 
     def update_v2(self, mc, network, time_stem, alpha=0.5, gamma=0.5, q_max_func=q_max_function):
         """
@@ -130,27 +388,29 @@ class Q_learning:
 
     def set_reward(self, mc=None, time_stem=0, network=None):
         """
-        Đặt các phần thưởng cho mỗi hành động.
+        Đặt các phần thưởng cho mỗi hành động. Nếu có reward_tolerance và tập yêu cầu, năng lượng các nút và
+        vị trí MC không đổi (trong phạm vi reward_tolerance) so với một quyết định gần đây, kết quả cũ được dùng lại.
 
         Args:
             mc (object): Đối tượng MC.
             time_stem (int): Thời gian.
             network (object): Đối tượng mạng.
         """
-        first = np.asarray([0.0 for _ in self.action_list], dtype=float)
-        second = np.asarray([0.0 for _ in self.action_list], dtype=float)
-        third = np.asarray([0.0 for _ in self.action_list], dtype=float)
-        for index, row in enumerate(self.q_table):
-            temp = reward_function(network=network, mc=mc, q_learning=self, state=index, time_stem=time_stem)
-            first[index] = temp[0]
-            second[index] = temp[1]
-            third[index] = temp[2]
-            self.charging_time[index] = temp[3]
-        first = first / np.sum(first)
-        second = second / np.sum(second)
-        third = third / np.sum(third)
-        self.reward = first + second + third
-        self.reward_max = list(zip(first, second, third))
+        key = self.reward_cache.key(network, mc, self) if self.reward_cache.enabled else None
+        cached = self.reward_cache.get(key) if key is not None else None
+        if cached is None:
+            first, second, third, charging_time = batch_reward_function(network=network, mc=mc, q_learning=self,
+                                                                        time_stem=time_stem)
+            first = first / np.sum(first)
+            second = second / np.sum(second)
+            third = third / np.sum(third)
+            cached = (first + second + third, list(zip(first, second, third)), charging_time.tolist())
+            if key is not None:
+                self.reward_cache.put(key, cached)
+        reward, reward_max, charging_time = cached
+        self.reward = reward.copy()
+        self.reward_max = list(reward_max)
+        self.charging_time = list(charging_time)
 
     def choose_next_state(self, mc, network):
         """
@@ -0,0 +1,235 @@
+import heapq
+
+import numpy as np
+
+
+class RequestQueue:
+    """
+    Hàng đợi yêu cầu sạc lưu dưới dạng các mảng NumPy liền kề (mỗi yêu cầu là một hàng, theo thứ tự gửi).
+    Mỗi nút có nhiều nhất một yêu cầu: chỉ mục nút -> hàng cho phép kiểm tra trùng trong O(1).
+    Một heap theo thời điểm chết dự kiến time + (energy - threshold) / energyCS (threshold của chính nút)
+    cho phép lấy yêu cầu khẩn cấp nhất trong O(log n). Heap được cập nhật lười: mỗi chỉ mục nút có một
+    bộ đếm phiên bản, tăng khi yêu cầu của nút được thêm hoặc xóa, nên các phần tử cũ bị bỏ qua khi lấy ra.
+
+    Hàng đợi vẫn dùng được như danh sách các dict cũ (append, len, duyệt, truy cập theo chỉ số),
+    còn mã tính phần thưởng đọc trực tiếp các mảng ids, energy, energyCS.
+
+    Args:
+        requests (iterable): Các yêu cầu (dict) ban đầu.
+    """
+
+    def __init__(self, requests=()):
+        self._size = 0
+        self._ids = np.zeros(8, dtype=np.int64)
+        self._energy = np.zeros(8, dtype=np.float64)
+        self._energyCS = np.zeros(8, dtype=np.float64)
+        self._energyRR = np.zeros(8, dtype=np.float64)
+        self._time = np.zeros(8, dtype=np.float64)
+        self._threshold = np.zeros(8, dtype=np.float64)
+        self._slot = np.full(0, -1, dtype=np.int64)
+        self._version = np.zeros(0, dtype=np.int64)
+        self._heap = []
+        for request in requests:
+            self.append(request)
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    @property
+    def energy(self):
+        return self._energy[:self._size]
+
+    @property
+    def energyCS(self):
+        return self._energyCS[:self._size]
+
+    @property
+    def energyRR(self):
+        return self._energyRR[:self._size]
+
+    @property
+    def time(self):
+        return self._time[:self._size]
+
+    @property
+    def threshold(self):
+        return self._threshold[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def __contains__(self, node_id):
+        return 0 <= node_id < len(self._slot) and self._slot[node_id] >= 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._size))]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("request index out of range")
+        return {"id": int(self._ids[index]), "energy": float(self._energy[index]),
+                "energyCS": float(self._energyCS[index]), "energyRR": float(self._energyRR[index]),
+                "time": float(self._time[index]), "threshold": float(self._threshold[index])}
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+    def __repr__(self):
+        return "RequestQueue({})".format(list(self))
+
+    def _grow(self, node_id):
+        if self._size == len(self._ids):
+            for name in ("_ids", "_energy", "_energyCS", "_energyRR", "_time", "_threshold"):
+                array = getattr(self, name)
+                setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        if node_id >= len(self._slot):
+            size = max(node_id + 1, 2 * len(self._slot))
+            slot = np.full(size, -1, dtype=np.int64)
+            slot[:len(self._slot)] = self._slot
+            self._slot = slot
+            version = np.zeros(size, dtype=np.int64)
+            version[:len(self._version)] = self._version
+            self._version = version
+
+    @staticmethod
+    def death_time(energy, energyCS, time, threshold):
+        """
+        Thời điểm chết dự kiến của nút gửi yêu cầu (vô cùng nếu nút không tiêu thụ năng lượng).
+        """
+        if energyCS <= 0:
+            return float("inf")
+        return time + (energy - threshold) / energyCS
+
+    def push(self, node_id, energy, energyCS, energyRR=0.0, time=0.0, threshold=0.0):
+        """
+        Thêm yêu cầu của một nút; bỏ qua nếu nút đã có yêu cầu trong hàng đợi.
+
+        Args:
+            node_id (int): ID nút.
+            energy (float): Năng lượng của nút lúc gửi yêu cầu.
+            energyCS (float): Tốc độ tiêu thụ năng lượng của nút.
+            energyRR (float): Tốc độ nhận năng lượng của nút.
+            time (float): Thời điểm gửi yêu cầu.
+            threshold (float): Ngưỡng năng lượng của nút (net.state.threshold[node_id]).
+
+        Returns:
+            bool: True nếu yêu cầu được thêm.
+        """
+        node_id = int(node_id)
+        if node_id in self:
+            return False
+        self._grow(node_id)
+        row = self._size
+        self._ids[row] = node_id
+        self._energy[row] = energy
+        self._energyCS[row] = energyCS
+        self._energyRR[row] = energyRR
+        self._time[row] = time
+        self._threshold[row] = threshold
+        self._slot[node_id] = row
+        self._size += 1
+        self._version[node_id] += 1
+        heapq.heappush(self._heap, (self.death_time(energy, energyCS, time, threshold),
+                                    int(self._version[node_id]), node_id))
+        return True
+
+    def append(self, request):
+        """
+        Thêm một yêu cầu dạng dict (như request_function tạo ra).
+        """
+        self.push(request["id"], request["energy"], request["energyCS"], request.get("energyRR", 0.0),
+                  request.get("time", 0.0), request.get("threshold", 0.0))
+
+    def extend(self, requests):
+        for request in requests:
+            self.append(request)
+
+    def retain(self, keep):
+        """
+        Giữ lại các yêu cầu theo mặt nạ (theo thứ tự hàng), các yêu cầu còn lại bị xóa.
+
+        Args:
+            keep (numpy.ndarray): Mặt nạ kích thước len(self).
+
+        Returns:
+            numpy.ndarray: ID các nút có yêu cầu bị xóa.
+        """
+        keep = np.asarray(keep, dtype=bool)
+        removed = self.ids[~keep].copy()
+        if len(removed) == 0:
+            return removed
+        size = int(np.count_nonzero(keep))
+        for name in ("_ids", "_energy", "_energyCS", "_energyRR", "_time", "_threshold"):
+            array = getattr(self, name)
+            array[:size] = array[:self._size][keep]
+        self._slot[removed] = -1
+        self._size = size
+        self._slot[self._ids[:size]] = np.arange(size)
+        self._version[removed] += 1
+        if len(self._heap) > 2 * self._size + 16:
+            self._heap = [entry for entry in self._heap if self._valid(entry)]
+            heapq.heapify(self._heap)
+        return removed
+
+    def remove_nodes(self, node_ids):
+        """
+        Xóa các yêu cầu của các nút trong node_ids (ví dụ mọi nút của một cụm vừa được sạc).
+
+        Args:
+            node_ids (iterable): ID các nút.
+
+        Returns:
+            numpy.ndarray: ID các nút có yêu cầu bị xóa.
+        """
+        node_ids = np.asarray(list(node_ids), dtype=np.int64)
+        return self.retain(~np.isin(self.ids, node_ids))
+
+    def remove_cluster(self, layout, id_cluster):
+        """
+        Xóa các yêu cầu của mọi nút thuộc một cụm.
+
+        Args:
+            layout (ClusterLayout): Kết quả phân cụm của mạng.
+            id_cluster (int): Chỉ số cụm.
+
+        Returns:
+            numpy.ndarray: ID các nút có yêu cầu bị xóa.
+        """
+        return self.remove_nodes(layout.members[id_cluster])
+
+    def clear(self):
+        self.retain(np.zeros(self._size, dtype=bool))
+
+    def _valid(self, entry):
+        _, version, node_id = entry
+        return self._slot[node_id] >= 0 and self._version[node_id] == version
+
+    def peek(self):
+        """
+        Returns:
+            dict: Yêu cầu có thời điểm chết dự kiến sớm nhất, None nếu hàng đợi rỗng.
+        """
+        while self._heap and not self._valid(self._heap[0]):
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+        return self[int(self._slot[self._heap[0][2]])]
+
+    def pop(self):
+        """
+        Lấy ra và xóa yêu cầu có thời điểm chết dự kiến sớm nhất.
+
+        Returns:
+            dict: Yêu cầu đã lấy ra.
+        """
+        request = self.peek()
+        if request is None:
+            raise IndexError("pop from an empty RequestQueue")
+        self.remove_nodes([request["id"]])
+        return request
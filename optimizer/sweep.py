@@ -0,0 +1,245 @@
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+DEFAULT_STORE = os.path.join("results", "sweep")
+EPSILONS = [0, 0.01, 0.1, 0.2, 0.3, 0.5]
+ALPHA_GAMMAS = [0.05, 0.1, 0.15, 0.2, 0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9]
+NB_NODES = [50, 100, 150, 200]
+
+
+def scenario_path(nb_nodes, prefix="hanoi1000n"):
+    """
+    Đường dẫn kịch bản mạng theo số lượng nút.
+
+    Args:
+        nb_nodes (int | str): Số lượng nút (50, 100, 150, 200).
+        prefix (str): Tiền tố tên tệp kịch bản.
+
+    Returns:
+        str: Đường dẫn tệp kịch bản.
+    """
+    return os.path.join("physical_env", "network", "network_scenarios", "{}{}.yaml".format(prefix, nb_nodes))
+
+
+def cell_key(cell):
+    """
+    Khóa của một ô trong lưới tham số, không phụ thuộc thứ tự các tham số.
+
+    Args:
+        cell (dict): Tham số của ô (scenario, alpha, q_gamma, epsilon, seed, ...).
+
+    Returns:
+        str: Khóa của ô.
+    """
+    return hashlib.sha1(json.dumps(cell, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ResultStore:
+    """
+    Kho kết quả cục bộ: mỗi ô của lưới tham số là một tệp JSON trong thư mục `root`,
+    đặt tên theo khóa của ô. Tệp được ghi trọn vẹn (ghi tạm rồi đổi tên) nên một ô chỉ được
+    coi là xong khi tệp của nó tồn tại.
+
+    Args:
+        root (str): Thư mục lưu kết quả.
+    """
+
+    def __init__(self, root=DEFAULT_STORE):
+        self.root = root
+
+    def path(self, cell):
+        return os.path.join(self.root, cell_key(cell) + ".json")
+
+    def has(self, cell):
+        return os.path.exists(self.path(cell))
+
+    def put(self, cell, result):
+        """
+        Lưu kết quả của một ô.
+
+        Args:
+            cell (dict): Tham số của ô.
+            result (dict): Kết quả (lifetime, ...).
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(cell)
+        with open(path + ".tmp", 'w') as file:
+            json.dump({"cell": cell, "result": result}, file)
+        os.replace(path + ".tmp", path)
+
+    def records(self):
+        """
+        Returns:
+            list: Các bản ghi {"cell": ..., "result": ...} đã lưu.
+        """
+        if not os.path.isdir(self.root):
+            return []
+        records = []
+        for name in sorted(os.listdir(self.root)):
+            if name.endswith(".json"):
+                with open(os.path.join(self.root, name), 'r') as file:
+                    records.append(json.load(file))
+        return records
+
+    def lifetimes(self, scenarios, until=None, energy_mode="discrete", include_censored=False, **params):
+        """
+        Thời gian sống trung bình (qua các seed) của mạng với từng kịch bản và bộ tham số cho trước.
+        Chỉ các lần chạy cùng giới hạn thời gian (until) và cùng mô hình năng lượng được gộp với nhau;
+        lần chạy bị cắt trước khi mạng chết (censored) bị bỏ qua trừ khi include_censored.
+
+        Args:
+            scenarios (list): Các đường dẫn kịch bản.
+            until (float): Giới hạn thời gian mô phỏng của các lần chạy; None là chạy tới khi mạng chết.
+            energy_mode (str): Mô hình năng lượng của các lần chạy.
+            include_censored (bool): Gộp cả các lần chạy bị cắt (thời gian sống chỉ là cận dưới).
+            **params: Giá trị tham số cần khớp (alpha, q_gamma, epsilon, ...).
+
+        Returns:
+            list: Thời gian sống của từng kịch bản, None nếu còn kịch bản chưa có kết quả.
+        """
+        values = {scenario: [] for scenario in scenarios}
+        for record in self.records():
+            cell, result = record["cell"], record["result"]
+            if cell.get("scenario") not in values or not self.matches(cell, until=until, energy_mode=energy_mode,
+                                                                      **params):
+                continue
+            if result.get("censored", False) and not include_censored:
+                continue
+            values[cell["scenario"]].append(result["lifetime"])
+        if any(not items for items in values.values()):
+            return None
+        return [float(np.mean(values[scenario])) for scenario in scenarios]
+
+    @staticmethod
+    def matches(cell, **params):
+        """
+        Kiểm tra một ô có khớp các giá trị tham số hay không; thiếu khóa nghĩa là không khớp.
+
+        Args:
+            cell (dict): Tham số của ô.
+            **params: Giá trị tham số cần khớp (số thực được so sánh gần đúng, còn lại so sánh bằng).
+
+        Returns:
+            bool: True nếu mọi tham số đều khớp.
+        """
+        for name, value in params.items():
+            if name not in cell:
+                return False
+            other = cell[name]
+            if value is None or other is None or isinstance(value, str) or isinstance(other, str):
+                if other != value:
+                    return False
+            elif not np.isclose(other, value):
+                return False
+        return True
+
+
+def make_grid(scenarios, alphas=(0.1,), q_gammas=(0.1,), epsilons=(0,), seeds=(0,), until=None,
+              energy_mode="discrete"):
+    """
+    Lưới tham số Q_learning(alpha, q_gamma, epsilon) x kịch bản x seed.
+
+    Returns:
+        list: Danh sách các ô (dict).
+    """
+    # Ép kiểu để 0 và 0.0 cho cùng một khóa.
+    return [{"scenario": scenario, "alpha": float(alpha), "q_gamma": float(q_gamma), "epsilon": float(epsilon),
+             "seed": int(seed), "until": None if until is None else float(until), "energy_mode": energy_mode}
+            for scenario, alpha, q_gamma, epsilon, seed in itertools.product(scenarios, alphas, q_gammas,
+                                                                             epsilons, seeds)]
+
+
+def run_cell(cell):
+    """
+    Chạy mô phỏng của một ô và đo thời gian sống của mạng.
+
+    Args:
+        cell (dict): Tham số của ô.
+
+    Returns:
+        tuple: Ô và kết quả của nó.
+    """
+    from optimizer.parallel_trainer import load_mc_type, run_episode
+    from optimizer.q_learning_heuristic import Q_learning
+
+    start = time.time()
+    q_learning = Q_learning(nb_action=31, alpha=cell["alpha"], q_gamma=cell["q_gamma"], epsilon=cell["epsilon"])
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        net = run_episode(q_learning, cell["scenario"], load_mc_type(), until=cell["until"], seed=cell["seed"],
+                          energy_mode=cell["energy_mode"])
+    result = {"lifetime": float(net.env.now), "censored": bool(net.alive), "nb_dead": net.check_nodes(),
+              "wall_time": time.time() - start, "reward_cache": q_learning.reward_cache.stats()}
+    return cell, result
+
+
+class Sweep:
+    """
+    Chạy một lưới tham số trên nhiều tiến trình và ghi kết quả vào ResultStore.
+    Các ô đã có kết quả được bỏ qua, nên một lần chạy bị ngắt có thể chạy tiếp.
+
+    Args:
+        cells (list): Các ô của lưới (xem make_grid).
+        store (ResultStore): Kho kết quả.
+        nb_workers (int): Số tiến trình; mặc định là số lõi CPU.
+    """
+
+    def __init__(self, cells, store=None, nb_workers=None):
+        self.cells = cells
+        self.store = store or ResultStore()
+        self.nb_workers = nb_workers or os.cpu_count() or 1
+
+    def pending(self):
+        return [cell for cell in self.cells if not self.store.has(cell)]
+
+    def run(self):
+        """
+        Returns:
+            int: Số ô đã chạy trong lần gọi này.
+        """
+        pending = self.pending()
+        if not pending:
+            return 0
+        with multiprocessing.Pool(min(self.nb_workers, len(pending))) as pool:
+            for done, (cell, result) in enumerate(pool.imap_unordered(run_cell, pending), 1):
+                self.store.put(cell, result)
+                print("[Sweep] {}/{} {} -> {:.0f}s".format(done, len(pending), cell, result["lifetime"]))
+        return len(pending)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quét tham số Q-learning và lưu thời gian sống của mạng.")
+    parser.add_argument("--nodes", type=int, nargs="+", default=NB_NODES)
+    parser.add_argument("--alpha", type=float, nargs="+", default=[0.1])
+    parser.add_argument("--gamma", type=float, nargs="+", default=None,
+                        help="mặc định 0.1, cộng thêm chuỗi ALPHA_GAMMAS trên kịch bản 50 nút mà plot.py vẽ")
+    parser.add_argument("--epsilon", type=float, nargs="+", default=EPSILONS)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--until", type=float, default=None)
+    parser.add_argument("--energy-mode", default="discrete", choices=["discrete", "analytic"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--store", default=DEFAULT_STORE)
+    args = parser.parse_args(argv)
+
+    cells = make_grid([scenario_path(nb_nodes) for nb_nodes in args.nodes], alphas=args.alpha,
+                      q_gammas=[0.1] if args.gamma is None else args.gamma, epsilons=args.epsilon, seeds=args.seeds,
+                      until=args.until, energy_mode=args.energy_mode)
+    if args.gamma is None:
+        # Chuỗi gamma của plot.py (gamma_sweep): alpha=0.1, epsilon=0 trên kịch bản 50 nút.
+        cells += make_grid([scenario_path(50)], alphas=[0.1], q_gammas=ALPHA_GAMMAS, epsilons=[0], seeds=args.seeds,
+                           until=args.until, energy_mode=args.energy_mode)
+        cells = list({cell_key(cell): cell for cell in cells}.values())
+    sweep = Sweep(cells, store=ResultStore(args.store), nb_workers=args.workers)
+    print("[Sweep] {} cells, {} already done".format(len(cells), len(cells) - len(sweep.pending())))
+    sweep.run()
+
+
+if __name__ == "__main__":
+    main()
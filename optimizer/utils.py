@@ -11,6 +11,7 @@ from itertools import combinations
 from matplotlib.patches import Rectangle
 import math
 import pickle
+from collections import OrderedDict
 from optimizer import parameter as para
 from physical_env.network.utils import find_receiver
 from physical_env.network import Node
@@ -43,18 +44,268 @@ def reward_function(network, mc, q_learning, state, time_stem):
     Returns:
         tuple: Bao gồm các phần thưởng đầu tiên, thứ hai và thứ ba, cùng với thời gian sạc.
     """
-    alpha = q_learning.alpha
-    charging_time = get_charging_time(network, mc, q_learning, time_stem=time_stem, state=state, alpha=alpha)
-    w, nb_target_alive = get_weight(network, mc, q_learning, state, charging_time)
-    p = get_charge_per_sec(network, q_learning, state)
-    p_hat = p / np.sum(p)
-    E = np.asarray([network.listNodes[request["id"]].energy for request in q_learning.list_request])
-    e = np.asarray([request["energyCS"] for request in q_learning.list_request])
+    first, second, third, charging_time = batch_reward_function(network, mc, q_learning, time_stem, states=[state])
+    return first[0], second[0], third[0], charging_time[0]
+
+def batch_reward_function(network, mc, q_learning, time_stem, states=None):
+    """
+    Tính toán các phần thưởng cho nhiều hành động cùng lúc. Ma trận khoảng cách hành động x nút
+    được tính một lần, các thành phần phần thưởng và thời gian sạc của mọi hành động được tính
+    bằng phép toán mảng, cho cùng kết quả với reward_function gọi cho từng hành động.
+
+    Args:
+        network (object): Đối tượng mạng.
+        mc (object): Đối tượng MC.
+        q_learning (object): Q-learning.
+        time_stem (int): Thời gian.
+        states (list): Các trạng thái cần tính, mặc định là mọi hàng của bảng Q.
+
+    Returns:
+        tuple: Các mảng phần thưởng thứ nhất, thứ hai, thứ ba và thời gian sạc của từng hành động.
+    """
+    if states is None:
+        states = range(len(q_learning.q_table))
+    states = np.asarray(states, dtype=np.int64)
+    _, action_rate = q_learning.get_action_matrices(network)
+    actions = q_learning.action_positions[states]
+    request_ids = q_learning.list_request.ids
+    e = q_learning.list_request.energyCS
+    E = network.state.energy[request_ids]
+    p = action_rate[np.ix_(states, request_ids)]
+
+    charging_time = q_learning.get_charging_times(network, mc, time_stem, q_learning.alpha)[states]
+    w, nb_target_alive = get_weights(network, mc, q_learning, actions, p, charging_time, request_ids, e, E)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p_hat = p / np.sum(p, axis=1, keepdims=True)
     second = nb_target_alive ** 2 / len(network.listTargets)
-    third = np.sum(w * p_hat)
-    first = np.sum(e * p / E)
+    third = np.sum(w * p_hat, axis=1)
+    first = np.sum(e * p / E, axis=1)
     return first, second, third, charging_time
 
+def get_charging_times(network, mc, actions, action_rate, alpha=0.5):
+    """
+    Tính toán thời gian sạc dự kiến của MC tại từng vị trí sạc (dạng mảng của get_charging_time).
+
+    Args:
+        network (object): Đối tượng mạng.
+        mc (object): Đối tượng MC.
+        actions (numpy.ndarray): Tọa độ các vị trí sạc, kích thước (A, 2).
+        action_rate (numpy.ndarray): Công suất sạc từ từng vị trí sạc tới từng nút, kích thước (A, N).
+        alpha (float): Tham số điều chỉnh.
+
+    Returns:
+        numpy.ndarray: Thời gian sạc dự kiến tại từng vị trí sạc.
+    """
+    time_move = distance.cdist([mc.location], actions)[0] / mc.velocity
+    energy_min = network.listNodes[0].threshold + alpha * network.listNodes[0].capacity
+    avg_energy_consumption = action_rate - network.state.energyCS
+    charging = avg_energy_consumption > 0
+    time_to_charge = np.divide(energy_min - network.state.energy, avg_energy_consumption,
+                               out=np.zeros_like(avg_energy_consumption), where=charging)
+    charging_time = np.max(time_to_charge, axis=1, initial=0)
+    return charging_time + time_move
+
+def get_weights(net, mc, q_learning, actions, p, charging_time, request_ids, e, E):
+    """
+    Tính toán trọng số của các yêu cầu và số lượng mục tiêu còn sống cho từng hành động
+    (dạng mảng của get_weight).
+
+    Args:
+        net (object): Đối tượng mạng.
+        mc (object): Đối tượng MC.
+        q_learning (object): Q-learning.
+        actions (numpy.ndarray): Tọa độ các vị trí sạc, kích thước (A, 2).
+        p (numpy.ndarray): Công suất sạc nhận được của từng yêu cầu tại từng vị trí, kích thước (A, R).
+        charging_time (numpy.ndarray): Thời gian sạc dự kiến tại từng vị trí.
+        request_ids (numpy.ndarray): ID nút của từng yêu cầu.
+        e (numpy.ndarray): energyCS của từng yêu cầu.
+        E (numpy.ndarray): Năng lượng hiện tại của nút gửi từng yêu cầu.
+
+    Returns:
+        tuple: Trọng số cho mỗi yêu cầu và số lượng mục tiêu còn sống cho từng hành động.
+    """
+    incidence = q_learning.get_path_incidence(net)
+    w = incidence.path_count(request_ids)
+    total_weight = np.sum(w) + len(w) * 10 ** -3
+    w = (w + 10 ** -3) / total_weight
+
+    time_move = distance.cdist([q_learning.action_list[mc.state]], actions)[0] / mc.velocity
+    dead = (E - time_move[:, None] * e) + (p - e) * charging_time[:, None] < 0
+    nb_target_alive = incidence.count_alive(dead, request_ids)
+    return w, nb_target_alive
+
+class PathIncidence:
+    """
+    Đường đi của mọi nút về trạm cơ sở (như get_path) được tính một lần từ cây định tuyến hiện tại.
+    Các đường đi tạo thành một rừng cây (nút -> nút nhận), nên nút x nằm trên đường đi của nút s
+    khi và chỉ khi s thuộc cây con của x. Mỗi cây con được đánh số bằng một đoạn liên tiếp
+    [tin, tout) theo thứ tự duyệt cây, nhờ đó số đường đi qua một nút là kích thước cây con của nó
+    và số đường đi bị cắt bởi một tập nút là độ dài hợp các đoạn.
+
+    Args:
+        net (object): Đối tượng mạng.
+
+    Attributes:
+        parent (numpy.ndarray): Nút tiếp theo trên đường đi của từng nút (-1 nếu đường đi kết thúc).
+        size (numpy.ndarray): Số đường đi đi qua từng nút.
+        tin (numpy.ndarray): Vị trí bắt đầu cây con của từng nút.
+        tout (numpy.ndarray): Vị trí kết thúc (không tính) cây con của từng nút.
+        reach_base (numpy.ndarray): Đường đi của từng nút có tới trạm cơ sở hay không.
+        version (int): Phiên bản cây định tuyến dùng để tính.
+    """
+
+    def __init__(self, net):
+        self.network = net
+        routing = net.get_routing()
+        state = net.state
+        nb_nodes = state.nb_nodes
+        self.version = routing.version
+        # Giống get_path: nút trong phạm vi para.base gửi thẳng về trạm cơ sở.
+        direct = distance.cdist(state.location, [para.base])[:, 0] <= state.com_range
+        parent = routing.parent.copy()
+        parent[(parent == routing.base_station) | direct] = -1
+        self.parent = parent
+
+        roots = np.flatnonzero(parent < 0)
+        children = np.flatnonzero(parent >= 0)
+        level = state.level
+        self.size = np.ones(nb_nodes, dtype=np.int64)
+        child_level = level[children]
+        for node_level in np.unique(child_level)[::-1]:
+            rows = children[child_level == node_level]
+            np.add.at(self.size, parent[rows], self.size[rows])
+
+        self.tin = np.zeros(nb_nodes, dtype=np.int64)
+        self.reach_base = np.zeros(nb_nodes, dtype=bool)
+        self.tin[roots] = np.cumsum(self.size[roots]) - self.size[roots]
+        self.reach_base[roots] = direct[roots]
+        # Các nút con của cùng một nút được xếp liền nhau, theo mức tăng dần của nút cha.
+        parent_level = level[parent[children]]
+        order = np.lexsort((children, parent[children], parent_level))
+        children, parent_level = children[order], parent_level[order]
+        for node_level in np.unique(parent_level):
+            rows = children[parent_level == node_level]
+            offsets = np.cumsum(self.size[rows]) - self.size[rows]
+            first = np.r_[True, parent[rows][1:] != parent[rows][:-1]]
+            offsets -= np.maximum.accumulate(np.where(first, offsets, 0))
+            self.tin[rows] = self.tin[parent[rows]] + 1 + offsets
+            self.reach_base[rows] = self.reach_base[parent[rows]]
+        self.tout = self.tin + self.size
+
+        self.reach_by_position = np.zeros(nb_nodes, dtype=bool)
+        self.reach_by_position[self.tin] = self.reach_base
+        self.nb_reach = int(np.count_nonzero(self.reach_base))
+
+    def path_count(self, node_ids):
+        """
+        Returns:
+            numpy.ndarray: Số đường đi đi qua từng nút trong node_ids.
+        """
+        return self.size[np.asarray(node_ids, dtype=np.int64)]
+
+    def count_alive(self, dead, node_ids):
+        """
+        Đếm số đường đi tới trạm cơ sở không đi qua nút chết nào, cho từng hành động.
+
+        Args:
+            dead (numpy.ndarray): Mặt nạ (A, R), nút node_ids[r] chết nếu chọn hành động a.
+            node_ids (numpy.ndarray): ID các nút, kích thước (R,).
+
+        Returns:
+            numpy.ndarray: Số đường đi còn sống cho từng hành động.
+        """
+        nb_nodes = len(self.size)
+        actions, columns = np.nonzero(dead)
+        nodes = np.asarray(node_ids, dtype=np.int64)[columns]
+        cover = np.zeros((dead.shape[0], nb_nodes + 1), dtype=np.int64)
+        np.add.at(cover, (actions, self.tin[nodes]), 1)
+        np.add.at(cover, (actions, self.tout[nodes]), -1)
+        broken = np.cumsum(cover[:, :nb_nodes], axis=1) > 0
+        return self.nb_reach - np.sum(broken & self.reach_by_position, axis=1)
+
+class RewardCache:
+    """
+    Bộ nhớ đệm LRU cho kết quả của batch_reward_function. Hai quyết định liên tiếp ở trạng thái gần như
+    ổn định (cùng tập yêu cầu, năng lượng các nút và vị trí MC gần như không đổi) dùng lại cùng một
+    kết quả thay vì tính lại phần thưởng của mọi hành động.
+
+    Khóa gồm: phiên bản cây định tuyến, trạng thái và vị trí của MC, tập ID các yêu cầu, năng lượng và
+    energyCS của các nút và energyCS của các yêu cầu. Năng lượng được lượng tử hóa theo bước
+    tolerance * capacity của từng nút và energyCS theo các khoảng tương đối rộng tolerance. Khi tolerance
+    là None hoặc không dương, bộ đệm tắt (khóa chứa giá trị thực của mọi nút nên gần như không bao giờ trùng).
+
+    Args:
+        maxsize (int): Số kết quả tối đa được giữ; kết quả ít được dùng gần đây nhất bị loại trước.
+        tolerance (float): Sai lệch tương đối được coi là không đổi, None để tắt bộ đệm.
+
+    Attributes:
+        hits (int): Số lần dùng lại kết quả.
+        misses (int): Số lần phải tính lại.
+    """
+
+    def __init__(self, maxsize=64, tolerance=None):
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.tolerance is not None and self.tolerance > 0
+
+    def quantize_energy(self, energy, capacity):
+        return np.floor(energy / (self.tolerance * capacity)).astype(np.int64).tobytes()
+
+    def quantize_rate(self, rate):
+        rate = np.asarray(rate, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            bins = np.floor(np.log(np.abs(rate)) / np.log1p(self.tolerance))
+        bins = np.where(rate != 0, bins, np.iinfo(np.int64).min).astype(np.int64)
+        return np.sign(rate).astype(np.int8).tobytes() + bins.tobytes()
+
+    def key(self, network, mc, q_learning):
+        """
+        Returns:
+            tuple: Khóa của quyết định hiện tại.
+        """
+        requests = q_learning.list_request
+        order = np.argsort(requests.ids, kind="stable")
+        request_ids = requests.ids[order]
+        request_rates = requests.energyCS[order]
+        state = network.state
+        return (network.get_routing().version, mc.state,
+                np.round(np.asarray(mc.location, dtype=np.float64), 6).tobytes(), q_learning.alpha,
+                request_ids.tobytes(), self.quantize_rate(request_rates),
+                self.quantize_energy(state.energy, state.capacity), self.quantize_rate(state.energyCS))
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: Số lần dùng lại, số lần tính lại, tỉ lệ dùng lại và số kết quả đang giữ.
+        """
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self.entries)}
+
 def init_function(nb_action=30):
     """
     Khởi tạo bảng Q với kích thước nhất định.
@@ -81,30 +332,14 @@ def get_weight(net, mc, q_learning, action_id, charging_time):
     Returns:
         tuple: Bao gồm trọng số cho mỗi yêu cầu và số lượng mục tiêu còn sống.
     """
-    p = get_charge_per_sec(net, q_learning, action_id)
-    all_path = get_all_path(net)
-    time_move = distance.euclidean(q_learning.action_list[mc.state],
-                                   q_learning.action_list[action_id]) / mc.velocity
-    list_dead = []
-    w = [0 for _ in q_learning.list_request]
-    for request_id, request in enumerate(q_learning.list_request):
-        temp = (net.listNodes[request["id"]].energy - time_move * request["energyCS"]) + (
-                p[request_id] - request["energyCS"]) * charging_time
-        if temp < 0:
-            list_dead.append(request["id"])
-    for request_id, request in enumerate(q_learning.list_request):
-        nb_path = 0
-        for path in all_path:
-            if request["id"] in path:
-                nb_path += 1
-        w[request_id] = nb_path
-    total_weight = sum(w) + len(w) * 10 ** -3
-    w = np.asarray([(item + 10 ** -3) / total_weight for item in w])
-    nb_target_alive = 0
-    for path in all_path:
-        if para.base in path and not (set(list_dead) & set(path)):
-            nb_target_alive += 1
-    return w, nb_target_alive
+    _, action_rate = q_learning.get_action_matrices(net)
+    request_ids = q_learning.list_request.ids
+    e = q_learning.list_request.energyCS
+    E = net.state.energy[request_ids]
+    actions = np.asarray([q_learning.action_list[action_id]], dtype=float).reshape(-1, 2)
+    p = action_rate[np.ix_([action_id], request_ids)]
+    w, nb_target_alive = get_weights(net, mc, q_learning, actions, p, np.asarray([charging_time]), request_ids, e, E)
+    return w, nb_target_alive[0]
 
 def get_path(net, sensor_id):
     """
@@ -153,10 +388,8 @@ def get_charge_per_sec(net, q_learning, state):
     Returns:
         list: Danh sách tỷ lệ sạc cho mỗi yêu cầu tại trạng thái cụ thể.
     """
-    arr = []
-    for request in q_learning.list_request:
-        arr.append(para.alpha / (distance.euclidean(net.listNodes[request["id"]].location, q_learning.action_list[state]) + para.beta) ** 2)
-    return arr
+    _, action_rate = q_learning.get_action_matrices(net)
+    return action_rate[state, q_learning.list_request.ids].tolist()
 
 def get_charging_time(network=None, mc=None, q_learning=None, time_stem=0, state=None, alpha=0.5): 
     """
@@ -173,28 +406,7 @@ def get_charging_time(network=None, mc=None, q_learning=None, time_stem=0, state
     Returns:
         float: Thời gian sạc dự kiến.
     """
-    time_move = distance.euclidean(mc.location, q_learning.action_list[state]) / mc.velocity
-    energy_min = network.listNodes[0].threshold + alpha * network.listNodes[0].capacity
-    
-    avg_energy_consumption = []
-    for node in network.listNodes:
-        d = distance.euclidean(q_learning.action_list[state], node.location)
-        p = para.alpha / (d + para.beta) ** 2
-        avg_energy_consumption.append(p - node.energyCS)
-    
-    charging_times = []
-    for i, pos in enumerate(q_learning.action_list):
-        charging_time = 0
-        for j, node in enumerate(network.listNodes):
-            if avg_energy_consumption[j] > 0:
-                d = distance.euclidean(pos, node.location)
-                time_to_charge = (energy_min - node.energy) / avg_energy_consumption[j]
-                charging_time = max(charging_time, time_to_charge)
-        charging_times.append(charging_time)
-    
-    total_charging_time = max(charging_times) + time_move
-    
-    return total_charging_time
+    return q_learning.get_charging_times(network, mc, time_stem, alpha)[state]
 
 def network_clustering_v2(optimizer, network=None, nb_cluster=81):
     """
@@ -3,6 +3,8 @@ from scipy.spatial import distance
 from scipy.spatial.distance import euclidean
 import copy
 
+from physical_env.mc.Trajectory import Trajectory
+
 class MobileCharger:
     """
     Lớp đại diện cho một bộ sạc di động để sạc các nút trong mạng.
@@ -36,8 +38,15 @@ class MobileCharger:
         end_time (float): Thời gian kết thúc hành động hiện tại.
         moving_time (float): Thời gian di chuyển.
         arrival_time (float): Thời gian đến điểm đến.
-        e_move (float): Năng lượng tiêu hao khi di chuyển.
+        e_move (float): Năng lượng tiêu hao mỗi giây di chuyển.
         next_location (list): Vị trí tiếp theo của bộ sạc di động.
+        trajectory (Trajectory): Đoạn di chuyển hiện tại, None khi bộ sạc đứng yên.
+        arrival_event (simpy.Event): Sự kiện tới điểm đến của đoạn di chuyển hiện tại.
+        charging_cutoff (float): Công suất sạc nhỏ nhất (mỗi tick) để một nút được sạc; None thì dùng công suất
+            của chính nút ở khoảng cách com_range (chỉ sạc các nút trong phạm vi com_range).
+        charging_sets (dict): Các nút được sạc và công suất sạc của chúng tại từng vị trí đứng đã gặp.
+        charging (tuple): Các nút đang được sạc, công suất sạc và thời điểm bắt đầu sạc; None khi không sạc.
+        decision_pending (bool): Còn một quyết định được hẹn tại end_time.
     """
 
     def __init__(self, location, mc_phy_spe):
@@ -52,6 +61,8 @@ class MobileCharger:
         self.env = None
         self.net = None
         self.id = None
+        self.trajectory = None
+        self.arrival_event = None
         self.cur_phy_action = [500, 500, 0]
         self.location = np.array(location)
         self.energy = mc_phy_spe['capacity']
@@ -64,6 +75,11 @@ class MobileCharger:
         self.pm = mc_phy_spe['pm']
         self.chargingRate = 0
         self.chargingRange = mc_phy_spe['charging_range']
+        self.charging_cutoff = mc_phy_spe.get('charging_cutoff')
+        self.charging_sets = {}
+        self.charging_net = None
+        self.charging = None
+        self.decision_pending = False
         self.epsilon = mc_phy_spe['epsilon']
         self.status = 1
         self.checkStatus()
@@ -87,6 +103,100 @@ class MobileCharger:
         self.e_move = mc_phy_spe['velocity']
         self.next_location = [500, 500]
 
+    @property
+    def energy(self):
+        """
+        Năng lượng hiện tại, đã trừ năng lượng di chuyển của đoạn đường đang đi tới thời điểm hiện tại.
+        """
+        if self.trajectory is None:
+            return self._energy
+        return self._energy - self.trajectory.energy_used(self.env.now)
+
+    @energy.setter
+    def energy(self, value):
+        self.settle()
+        self._energy = value
+
+    @property
+    def current(self):
+        """
+        Vị trí hiện tại, được tính từ đoạn di chuyển nếu bộ sạc đang di chuyển.
+        """
+        if self.trajectory is None:
+            return self._current
+        return self.trajectory.position(self.env.now)
+
+    @current.setter
+    def current(self, value):
+        self._current = value
+
+    def settle(self, arrive=False):
+        """
+        Ghi nhận năng lượng đã tiêu hao và vị trí của đoạn di chuyển hiện tại tới thời điểm hiện tại;
+        phần còn lại của đoạn đường trở thành đoạn di chuyển mới (cùng điểm đến và thời điểm tới).
+
+        Parameters:
+            arrive (bool): Kết thúc đoạn di chuyển tại điểm đến.
+
+        Returns:
+            None
+        """
+        trajectory = self.trajectory
+        if trajectory is None:
+            return
+        now = max(self.env.now, trajectory.arrival) if arrive else self.env.now
+        self._energy -= trajectory.energy_used(now)
+        if arrive or trajectory.arrived(now):
+            self.trajectory = None
+            self._current = self.end
+        else:
+            self.trajectory = Trajectory(trajectory.position(now), trajectory.end, now, trajectory.speed,
+                                         trajectory.energy_rate)
+
+    def move_to(self, end):
+        """
+        Bắt đầu di chuyển từ vị trí hiện tại tới end và lập lịch một sự kiện tới nơi duy nhất.
+        Điểm đến cách vị trí hiện tại dưới 1 được coi là đã tới.
+
+        Parameters:
+            end (tuple): Điểm đến.
+
+        Returns:
+            float: Thời gian di chuyển.
+        """
+        self.settle()
+        self.start = self.current
+        self.end = end
+        self.arrival_event = None
+        trajectory = Trajectory(self.start, end, self.env.now, self.velocity, self.e_move)
+        if trajectory.length < 1:
+            # Bỏ đoạn di chuyển còn dở (nếu bị đổi hướng khi đang đi), nếu không current vẫn đi tiếp tới đích cũ.
+            self.trajectory = None
+            self._current = end
+            self.is_stand = True
+            return 0
+        self.trajectory = trajectory
+        self.is_stand = False
+        self.arrival_event = self.env.timeout(trajectory.duration)
+        self.arrival_event.callbacks.append(self.arrive)
+        return trajectory.duration
+
+    def arrive(self, event):
+        """
+        Xử lý sự kiện tới điểm đến của đoạn di chuyển.
+
+        Parameters:
+            event (simpy.Event): Sự kiện tới nơi.
+
+        Returns:
+            None
+        """
+        if event is not self.arrival_event:
+            return
+        self.arrival_event = None
+        self.settle(arrive=True)
+        self.is_stand = True
+
     def charge_step(self, t):
         """
         Thực hiện bước sạc trong thời gian t.
@@ -109,7 +219,8 @@ class MobileCharger:
 
     def chargev2(self, net):
         """
-        Thực hiện sạc các nút trong mạng.
+        Thực hiện sạc các nút trong mạng trong một tick (cách cũ theo tick, chỉ dùng bởi runv2; operate
+        sạc qua start_charging/stop_charging với cùng tập nút của get_charging_set).
 
         Parameters:
             net (object): Đối tượng mạng.
@@ -117,19 +228,100 @@ class MobileCharger:
         Returns:
             None
         """
-        for nd in net.listNodes:
-            p = nd.charge(mc=self)
-            self.energy -= p
+        if not self.is_stand:
+            return
+        node_ids, power = self.get_charging_set(net)
+        state = net.state
+        energy = state.energy[node_ids]
+        capacity = state.capacity[node_ids]
+        charging = (energy <= capacity - 10 ** -5) & (state.status[node_ids] == 1)
+        p = np.where(charging, np.minimum(capacity - energy, power), 0)
+        state.energy[node_ids] = energy + p
+        self.energy -= float(np.sum(p))
+
+    def get_charging_set(self, net):
+        """
+        Lấy các nút được sạc khi bộ sạc đứng tại vị trí hiện tại và công suất sạc alpha / (d + beta) ** 2
+        (theo hằng số của từng nút) của chúng. Một nút được sạc nếu công suất không nhỏ hơn charging_cutoff,
+        mặc định là công suất của nút ở khoảng cách com_range. Kết quả được tính một lần cho mỗi vị trí đứng.
+
+        Parameters:
+            net (object): Đối tượng mạng.
+
+        Returns:
+            tuple: Mảng ID các nút và mảng công suất sạc tương ứng.
+        """
+        if self.charging_net is not net:
+            self.charging_sets = {}
+            self.charging_net = net
+        location = np.asarray(self.current, dtype=np.float64)
+        key = tuple(np.round(location, 6))
+        charging_set = self.charging_sets.get(key)
+        if charging_set is None:
+            alpha = np.asarray([node.alpha for node in net.listNodes], dtype=np.float64)
+            beta = np.asarray([node.beta for node in net.listNodes], dtype=np.float64)
+            d = np.sqrt(np.sum((net.state.location - location) ** 2, axis=1))
+            power = alpha / (d + beta) ** 2
+            if self.charging_cutoff is None:
+                # alpha / (d + beta) ** 2 >= alpha / (com_range + beta) ** 2 khi và chỉ khi d <= com_range.
+                node_ids = np.flatnonzero(d <= net.state.com_range)
+            else:
+                node_ids = np.flatnonzero(power >= self.charging_cutoff)
+            charging_set = (node_ids, power[node_ids])
+            self.charging_sets[key] = charging_set
+        return charging_set
+
+    def start_charging(self, net):
+        """
+        Bắt đầu sạc tại vị trí đứng hiện tại: công suất sạc được cộng vào energyRR của các nút còn sống,
+        mô hình năng lượng của mạng tự tích phân năng lượng nhận được (có chặn theo capacity).
+
+        Parameters:
+            net (object): Đối tượng mạng.
+
+        Returns:
+            None
+        """
+        node_ids, power = self.get_charging_set(net)
+        alive = net.state.status[node_ids] == 1
+        node_ids, power = node_ids[alive], power[alive]
+        net.state.energyRR[node_ids] += power
+        self.chargingRate = float(np.sum(power))
+        self.charging = (node_ids, power, net.state.charge_yield[node_ids].copy())
+        net.notify_energy_change()
+
+    def stop_charging(self, net):
+        """
+        Ngừng sạc: trả lại energyRR của các nút và trừ năng lượng các nút thực sự nhận được từ bộ sạc này
+        (sau khi chặn theo capacity). Nếu nhiều MC cùng sạc một nút, phần nhận được chia theo tỉ lệ công suất
+        trong từng khoảng thời gian (xem EnergyModel.add_yield).
+
+        Parameters:
+            net (object): Đối tượng mạng.
+
+        Returns:
+            None
+        """
+        if self.charging is None:
+            return
+        if net.energy_model is not None:
+            net.energy_model.sync()
+        node_ids, power, charge_yield = self.charging
+        state = net.state
+        self.energy -= float(np.sum(power * (state.charge_yield[node_ids] - charge_yield)))
+        state.energyRR[node_ids] -= power
+        self.chargingRate = 0
+        self.charging = None
+        net.notify_energy_change()
 
     def update_location(self):
         """
-        Cập nhật vị trí hiện tại của bộ sạc di động.
+        Cập nhật vị trí hiện tại và năng lượng của bộ sạc di động theo đoạn di chuyển hiện tại.
 
         Returns:
             None
         """
-        self.current = self.get_location()
-        self.energy -= self.e_move
+        self.settle()
 
     def get_location(mc):
         """
@@ -141,21 +333,7 @@ class MobileCharger:
         Returns:
             tuple: Vị trí hiện tại của bộ sạc di động.
         """
-        d = distance.euclidean(mc.start, mc.end)
-        time_move = d / mc.velocity
-        if time_move == 0:
-            return mc.current
-        elif distance.euclidean(mc.current, mc.end) < 10 ** -3:
-            return mc.end
-        else:
-            x_hat = (mc.end[0] - mc.start[0]) / time_move + mc.current[0]
-            y_hat = (mc.end[1] - mc.start[1]) / time_move + mc.current[1]
-            if (mc.end[0] - mc.current[0]) * (mc.end[0] - x_hat) < 0 or (
-                    (mc.end[0] - mc.current[0]) * (mc.end[0] - x_hat) == 0 and (mc.end[1] - mc.current[1]) * (
-                    mc.end[1] - y_hat) <= 0):
-                return mc.end
-            else:
-                return x_hat, y_hat
+        return mc.current
 
     def move_step(self, vector, t):
         """
@@ -298,8 +476,7 @@ class MobileCharger:
             None
         """
         next_location, charging_time = optimizer.update(self, network, time_stem)
-        self.start = self.current
-        self.end = next_location
+        self.move_to(next_location)
         self.moving_time = distance.euclidean(self.location, self.end) / self.velocity
         self.end_time = time_stem + self.moving_time + charging_time
         print("[Mobile Charger] MC end time {}".format(self.end_time))
@@ -308,7 +485,8 @@ class MobileCharger:
 
     def runv2(self, network, time_stem, net=None, optimizer=None):
         """
-        Chạy phiên bản 2 của bộ sạc di động.
+        Chạy phiên bản 2 của bộ sạc di động theo từng tick (cách cũ, giữ lại để tương thích; mô phỏng hiện
+        dùng tiến trình operate).
 
         Parameters:
             network (object): Đối tượng mạng.
@@ -321,32 +499,106 @@ class MobileCharger:
         """
         if (((not self.is_active) and optimizer.list_request) or (np.abs(time_stem - self.end_time) < 1)):
             self.is_active = True
-            new_list_request = []
-            for request in optimizer.list_request:
-                if net.listNodes[request["id"]].energy < net.listNodes[request["id"]].threshold * 30:
-                    new_list_request.append(request)
-                else:
-                    net.listNodes[request["id"]].is_request = False
-            optimizer.list_request = new_list_request
+            self.filter_requests(net, optimizer)
             if not optimizer.list_request:
                 self.is_active = False
             self.get_next_location(network=network, time_stem=time_stem, optimizer=optimizer)
         else:
-            if self.is_active:
-                if not self.is_stand:
-                    self.update_location()
-                elif not self.is_self_charge:
+            # Khi đang di chuyển, vị trí và năng lượng được tính theo đoạn di chuyển, không cần cập nhật mỗi tick.
+            if self.is_active and self.is_stand:
+                if not self.is_self_charge:
                     self.chargev2(net)
                 else:
                     self.recharge()
+        self.check_energy(time_stem)
+        self.check_state()
+
+    def filter_requests(self, net, optimizer):
+        """
+        Bỏ các yêu cầu của những nút đã có đủ năng lượng.
+
+        Parameters:
+            net (object): Đối tượng mạng.
+            optimizer (object): Đối tượng tối ưu hóa.
+
+        Returns:
+            None
+        """
+        requests = optimizer.list_request
+        ids = requests.ids
+        removed = requests.retain(net.state.energy[ids] < net.state.threshold[ids] * 30)
+        net.state.is_request[removed] = False
+
+    def check_energy(self, time_stem):
+        """
+        Quay về trạm cơ sở nếu năng lượng xuống dưới ngưỡng.
+
+        Parameters:
+            time_stem (float): Thời gian hiện tại.
+
+        Returns:
+            None
+        """
         if np.any(self.energy < self.threshold) and not self.is_self_charge and np.any(self.end != self.net.baseStation.location):
-            self.start = self.current
-            self.end = self.net.baseStation.location
-            self.is_stand = False
             charging_time = 0
-            moving_time = distance.euclidean(self.start, self.end) / self.velocity
+            moving_time = self.move_to(self.net.baseStation.location)
             self.end_time = time_stem + moving_time + charging_time
+
+    def decide(self, net, optimizer):
+        """
+        Lọc các yêu cầu, chọn vị trí sạc tiếp theo và hẹn quyết định sau tại end_time.
+
+        Parameters:
+            net (object): Đối tượng mạng.
+            optimizer (object): Đối tượng tối ưu hóa.
+
+        Returns:
+            None
+        """
+        now = self.env.now
+        self.stop_charging(net)
+        if net.energy_model is not None:
+            net.energy_model.sync()
+        self.is_active = True
+        self.filter_requests(net, optimizer)
+        if not optimizer.list_request:
+            self.is_active = False
+        self.get_next_location(network=net, time_stem=now, optimizer=optimizer)
+        self.check_energy(now)
         self.check_state()
+        self.decision_pending = self.end_time > now
+
+    def operate(self, net, optimizer):
+        """
+        Tiến trình simpy của bộ sạc di động. Bộ sạc chỉ thức dậy khi tới nơi, khi hết thời gian của hành động
+        hiện tại (end_time) hoặc khi có yêu cầu sạc mới lúc đang rảnh, thay vì được kiểm tra sau mỗi tick.
+        Trong lúc đứng sạc, năng lượng được truyền qua energyRR của các nút (xem start_charging).
+
+        Parameters:
+            net (object): Đối tượng mạng.
+            optimizer (object): Đối tượng tối ưu hóa.
+
+        Returns:
+            None
+        """
+        while net.alive:
+            now = self.env.now
+            idle = not self.is_active or not self.decision_pending
+            if (idle and optimizer.list_request) or (self.decision_pending and now >= self.end_time - 10 ** -9):
+                self.decide(net, optimizer)
+                idle = not self.is_active or not self.decision_pending
+            elif self.is_active and self.is_stand and not self.is_self_charge and self.charging is None:
+                self.start_charging(net)
+
+            events = []
+            if self.decision_pending:
+                events.append(self.env.timeout(max(self.end_time - now, 0)))
+            if self.arrival_event is not None:
+                events.append(self.arrival_event)
+            if idle:
+                events.append(net.request_event)
+            yield self.env.any_of(events)
+        self.stop_charging(net)
 
     def __str__(self):
         """
@@ -364,7 +616,7 @@ class MobileCharger:
         Returns:
             None
         """
-        if distance.euclidean(self.current, self.end) < 1:
+        if self.trajectory is None and distance.euclidean(self.current, self.end) < 1:
             self.is_stand = True
             self.current = self.end
         else:
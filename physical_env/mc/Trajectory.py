@@ -0,0 +1,91 @@
+import math
+
+
+class Trajectory:
+    """
+    Một đoạn di chuyển thẳng đều của bộ sạc di động từ start tới end, khởi hành lúc depart với vận tốc speed.
+    Vị trí và năng lượng tiêu hao tại một thời điểm bất kỳ được tính trực tiếp (O(1)), nên không cần
+    cập nhật vị trí của bộ sạc sau mỗi tick.
+
+    Attributes:
+        start (tuple): Điểm bắt đầu.
+        end (tuple): Điểm đến.
+        depart (float): Thời điểm khởi hành.
+        speed (float): Vận tốc di chuyển.
+        energy_rate (float): Năng lượng tiêu hao mỗi giây di chuyển.
+        length (float): Độ dài đoạn đường.
+        duration (float): Thời gian di chuyển hết đoạn đường.
+        arrival (float): Thời điểm tới điểm đến.
+    """
+
+    def __init__(self, start, end, depart, speed, energy_rate=0.0):
+        """
+        Khởi tạo đoạn di chuyển.
+
+        Parameters:
+            start (tuple): Điểm bắt đầu.
+            end (tuple): Điểm đến.
+            depart (float): Thời điểm khởi hành.
+            speed (float): Vận tốc di chuyển.
+            energy_rate (float): Năng lượng tiêu hao mỗi giây di chuyển.
+        """
+        self.start = (float(start[0]), float(start[1]))
+        self.end = (float(end[0]), float(end[1]))
+        self.depart = depart
+        self.speed = speed
+        self.energy_rate = energy_rate
+        self.length = math.hypot(self.end[0] - self.start[0], self.end[1] - self.start[1])
+        self.duration = self.length / speed if speed > 0 else 0.0
+        self.arrival = depart + self.duration
+
+    def elapsed(self, t):
+        """
+        Thời gian đã di chuyển tính tới thời điểm t (bị chặn trong [0, duration]).
+
+        Parameters:
+            t (float): Thời điểm.
+
+        Returns:
+            float: Thời gian đã di chuyển.
+        """
+        return min(max(t - self.depart, 0.0), self.duration)
+
+    def position(self, t):
+        """
+        Vị trí tại thời điểm t.
+
+        Parameters:
+            t (float): Thời điểm.
+
+        Returns:
+            tuple: Vị trí (x, y).
+        """
+        if self.duration == 0 or t >= self.arrival:
+            return self.end
+        ratio = self.elapsed(t) / self.duration
+        return (self.start[0] + (self.end[0] - self.start[0]) * ratio,
+                self.start[1] + (self.end[1] - self.start[1]) * ratio)
+
+    def energy_used(self, t):
+        """
+        Năng lượng đã tiêu hao để di chuyển tính tới thời điểm t.
+
+        Parameters:
+            t (float): Thời điểm.
+
+        Returns:
+            float: Năng lượng đã tiêu hao.
+        """
+        return self.energy_rate * self.elapsed(t)
+
+    def arrived(self, t):
+        """
+        Kiểm tra đã tới điểm đến tại thời điểm t hay chưa.
+
+        Parameters:
+            t (float): Thời điểm.
+
+        Returns:
+            bool: True nếu đã tới điểm đến.
+        """
+        return t >= self.arrival
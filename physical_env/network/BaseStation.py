@@ -1,4 +1,3 @@
-from scipy.spatial.distance import euclidean
 import numpy as np
 
 class BaseStation:
@@ -14,14 +13,12 @@ class BaseStation:
         self.direct_nodes = []
 
     def probe_neighbors(self):
-        for node in self.net.listNodes:
-            if euclidean(self.location, node.location) <= node.com_range:
-                self.direct_nodes.append(node)
+        index = self.net.get_spatial_index()
+        self.direct_nodes[:] = [self.net.listNodes[j] for j in index.direct_nodes]
 
     def receive_package(self, package):
         return
 
     def operate(self, t=1):
-        self.probe_neighbors()
         while True:
             yield self.env.timeout(t)
\ No newline at end of file
@@ -0,0 +1,239 @@
+import random
+
+import numpy as np
+
+from physical_env.network.NetworkState import node_constants
+
+
+class EnergyModel:
+    """
+    Phần chung của các mô hình năng lượng: các hằng số vô tuyến của từng nút dưới dạng mảng.
+    """
+
+    def __init__(self, net, t=1):
+        """
+        :param net: mạng
+        :param t: độ dài một tick (giây), lượng gói tin sinh ra được tính theo tick
+        """
+        self.net = net
+        self.env = net.env
+        self.state = net.state
+        self.t = t
+        nodes = net.listNodes
+        self.er = node_constants(nodes, "er")
+        self.package_size = node_constants(nodes, "package_size")
+        self.prob_gp = node_constants(nodes, "prob_gp")
+        self.alpha = node_constants(nodes, "alpha")
+        self.beta = node_constants(nodes, "beta")
+        index = net.get_spatial_index()
+        self.nb_targets = np.diff(index.target_indptr).astype(np.float64)
+
+    def send_energy(self):
+        """
+        Năng lượng để gửi một gói tin từ mỗi nút tới nút nhận hiện tại của nó.
+        """
+        return self.net.get_link_cost().parent_costs() * self.package_size
+
+    def kill(self, node_ids):
+        """
+        Đánh dấu các nút đã chạm ngưỡng là chết và sửa cây định tuyến một lần cho cả nhóm.
+        """
+        if len(node_ids) == 0:
+            return
+        self.state.energy[node_ids] = self.state.threshold[node_ids]
+        self.state.status[node_ids] = 0
+        self.state.energyCS[node_ids] = 0
+        self.net.nodes_died(node_ids)
+
+    def recharge(self, alive, dt):
+        """
+        Nạp năng lượng từ các MC (energyRR) trong dt giây cho các nút còn sống, chặn theo capacity,
+        và cộng phần thực sự nhận được (chia cho energyRR) vào state.charge_yield.
+        :param alive: mặt nạ các nút còn sống
+        :param dt: thời gian nạp
+        """
+        state = self.state
+        before = state.energy[alive]
+        after = np.minimum(before + state.energyRR[alive] * dt, state.capacity[alive])
+        state.energy[alive] = after
+        self.add_yield(alive, np.maximum(after - before, 0), state.energyRR[alive])
+
+    def add_yield(self, alive, absorbed, energyRR):
+        """
+        Cộng năng lượng nhận được trên mỗi đơn vị energyRR: MC có công suất p tại nút được tính p * charge_yield.
+        """
+        self.state.charge_yield[alive] += np.divide(absorbed, energyRR, out=np.zeros_like(absorbed),
+                                                    where=energyRR > 0)
+
+    def sync(self):
+        return
+
+    def notify(self):
+        return
+
+
+class DiscreteEnergyModel(EnergyModel):
+    """
+    Mô hình năng lượng rời rạc theo tick, tương đương với Node.operate của từng nút nhưng xử lý
+    toàn mạng cùng lúc: lưu lượng chuyển tiếp của mỗi nút được tính từ cây định tuyến và toàn bộ
+    năng lượng gửi/nhận được trừ trong một lượt, thay vì đệ quy send_package/receive_package
+    cho từng gói tin.
+    """
+
+    def transmit(self, generating):
+        """
+        Gửi các gói tin sinh ra trong tick hiện tại về trạm cơ sở.
+        Giữ nguyên quy tắc cắt ngưỡng: nút không đủ năng lượng cho một gói tin bị đưa về đúng
+        ngưỡng, chết và gói tin đó bị bỏ; các gói tin còn lại của nút cũng bị bỏ.
+        :param generating: mặt nạ các nút sinh gói tin trong tick này
+        """
+        routing = self.net.get_routing()
+        state = self.state
+        e_receive = self.er * self.package_size
+        e_send = self.send_energy()
+        generated = np.where(generating, self.nb_targets, 0)
+        incoming = np.zeros(state.nb_nodes)
+        routed = routing.parent >= 0
+        dead = []
+
+        active = np.flatnonzero((state.status == 1) & ((generated > 0) | routed))
+        levels = state.level[active]
+        for node_level in np.unique(levels)[::-1]:
+            rows = active[levels == node_level]
+            budget = state.energy[rows] - state.threshold[rows]
+            receive = incoming[rows]
+            own = np.where(routed[rows], generated[rows], 0)
+            step = np.where(routed[rows], e_receive[rows] + e_send[rows], e_receive[rows])
+            cost = receive * step + own * e_send[rows]
+
+            enough = budget >= cost
+            # Số gói chuyển tiếp và tự sinh mà nút trả được năng lượng trước khi cạn.
+            with np.errstate(divide='ignore', invalid='ignore'):
+                relayed = np.where(enough, receive, np.minimum(receive, np.floor(budget / step)))
+                left = budget - relayed * step
+                sent_own = np.where(enough, own, np.where(relayed < receive, 0,
+                                                          np.minimum(own, np.floor(left / e_send[rows]))))
+            spent = relayed * step + sent_own * e_send[rows]
+            # Gói chuyển tiếp bị bỏ vẫn tốn năng lượng nhận nếu nút còn đủ cho bước nhận.
+            spent += np.where(~enough & (relayed < receive) & (left >= e_receive[rows]), e_receive[rows], 0)
+
+            state.energy[rows] = np.where(enough, state.energy[rows] - cost, state.threshold[rows])
+            state.log_energy[rows] += spent
+            dead.extend(rows[state.energy[rows] <= state.threshold[rows]])
+
+            sent = np.where(routed[rows], relayed, 0) + sent_own
+            to_node = routed[rows] & (routing.parent[rows] != routing.base_station)
+            np.add.at(incoming, routing.parent[rows[to_node]], sent[to_node])
+        self.kill(np.asarray(dead, dtype=np.int64))
+
+    def draw_generating(self, alive):
+        """
+        Chọn các nút sinh gói tin trong tick này. Giữ đúng thứ tự rút số ngẫu nhiên của Node.operate:
+        mỗi nút còn sống rút một số random.random() theo thứ tự chỉ số, nên luồng số ngẫu nhiên của
+        random (và của np.random, vốn không bị dùng ở đây) giống hệt khi mỗi nút là một tiến trình.
+        :param alive: mặt nạ các nút còn sống
+        :return: mặt nạ các nút sinh gói tin
+        """
+        rows = np.flatnonzero(alive)
+        draws = np.fromiter((random.random() for _ in range(len(rows))), dtype=np.float64, count=len(rows))
+        generating = np.zeros(len(alive), dtype=bool)
+        generating[rows] = draws < self.prob_gp[rows]
+        return generating
+
+    def operate(self, t=1):
+        state = self.state
+        while True:
+            state.log_energy[:] = 0
+
+            yield self.env.timeout(t * 0.5)
+            alive = state.status == 1
+            self.recharge(alive, t * 0.5)
+            self.transmit(self.draw_generating(alive))
+
+            yield self.env.timeout(t * 0.5)
+            alive = state.status == 1
+            self.recharge(alive, t * 0.5)
+            state.update_consumption(np.flatnonzero(alive), self.alpha[alive], self.beta[alive])
+
+
+class AnalyticEnergyModel(EnergyModel):
+    """
+    Mô hình năng lượng giải tích (hướng sự kiện). Giữa hai sự kiện, năng lượng của mỗi nút
+    tuyến tính theo thời gian với tốc độ energyRR - (năng lượng gửi/nhận gói tin kỳ vọng mỗi giây
+    theo cây định tuyến hiện tại). Thay vì hai sự kiện mỗi giây cho mỗi nút, chỉ lập lịch các sự kiện:
+    nút chạm ngưỡng, MC kết nối/ngắt kết nối và cây định tuyến thay đổi.
+    """
+
+    def __init__(self, net, t=1):
+        super().__init__(net, t=t)
+        self.consumption = np.zeros(self.state.nb_nodes)
+        self.rate = np.zeros(self.state.nb_nodes)
+        self.last_time = self.env.now
+        self.routing_version = -1
+        self.wakeup = None
+
+    def update_rates(self):
+        routing = self.net.get_routing()
+        alive = self.state.status == 1
+        generated = np.where(alive, self.prob_gp * self.nb_targets, 0)
+        sent, received = routing.forward_load(generated)
+        self.consumption = (sent * self.send_energy() + received * self.er * self.package_size) / self.t
+        self.consumption[~alive] = 0
+        self.rate = np.where(alive, self.state.energyRR - self.consumption, 0)
+        self.routing_version = routing.version
+
+        self.state.energyCS[alive] = self.consumption[alive]
+        positive = alive & (self.consumption > 0)
+        self.state.radius[positive] = np.sqrt(self.alpha[positive] / self.consumption[positive]) - self.beta[positive]
+
+    def sync(self):
+        """
+        Đưa năng lượng của tất cả các nút tới thời điểm hiện tại và xử lý các nút chạm ngưỡng.
+        """
+        now = self.env.now
+        dt = now - self.last_time
+        self.last_time = now
+        if dt > 0:
+            alive = self.state.status == 1
+            energy = np.minimum(self.state.energy + self.rate * dt, self.state.capacity)
+            # Năng lượng nhận từ MC: phần tăng thực tế cộng phần bù tiêu thụ, không vượt energyRR * dt
+            # (energyRR của khoảng vừa qua là rate + consumption).
+            energyRR = np.maximum(self.rate + self.consumption, 0)
+            absorbed = np.clip(energy - self.state.energy + self.consumption * dt, 0, energyRR * dt)
+            self.state.energy[alive] = energy[alive]
+            self.add_yield(alive, absorbed[alive], energyRR[alive])
+        crossed = np.flatnonzero((self.state.status == 1) & (self.state.energy <= self.state.threshold + 1e-9))
+        self.kill(crossed)
+        if len(crossed) or self.routing_version != self.net.get_routing().version:
+            self.update_rates()
+            self.notify()
+
+    def next_crossing(self):
+        """
+        :return: thời gian (tính từ bây giờ) tới khi nút đầu tiên chạm ngưỡng
+        """
+        falling = (self.state.status == 1) & (self.rate < 0)
+        if not np.any(falling):
+            return None
+        headroom = self.state.energy[falling] - self.state.threshold[falling]
+        return max(float(np.min(headroom / -self.rate[falling])), 0.0)
+
+    def notify(self):
+        """
+        Báo cho mô hình rằng tốc độ nạp/tiêu thụ đã thay đổi (MC kết nối/ngắt kết nối, định tuyến đổi).
+        """
+        if self.wakeup is not None and not self.wakeup.triggered:
+            self.wakeup.succeed()
+
+    def operate(self, t=1):
+        self.last_time = self.env.now
+        self.update_rates()
+        while True:
+            self.wakeup = self.env.event()
+            horizon = self.next_crossing()
+            if horizon is None:
+                yield self.wakeup
+            else:
+                yield self.env.any_of([self.env.timeout(horizon), self.wakeup])
+            self.sync()
+            self.update_rates()
@@ -0,0 +1,51 @@
+import numpy as np
+
+from physical_env.network.NetworkState import node_constants
+
+
+class LinkCostTable:
+    """
+    Bảng năng lượng truyền từ mỗi nút tới nút nhận của nó trên cây định tuyến (nút cha hoặc trạm
+    cơ sở), tính cho mỗi bit của gói tin theo mô hình free-space/multipath.
+    Bảng được tính lại khi cây định tuyến thay đổi, nên đường gửi gói tin không phải tính lại
+    sqrt và lũy thừa cho mỗi gói tin.
+    """
+
+    def __init__(self, net):
+        """
+        :param net: mạng
+        """
+        self.net = net
+        self.state = net.state
+        nodes = net.listNodes
+        self.et = node_constants(nodes, "et")
+        self.efs = node_constants(nodes, "efs")
+        self.emp = node_constants(nodes, "emp")
+        self.d0 = np.sqrt(self.efs / self.emp)
+        self.routing_version = -1
+        self.parent_cost = np.zeros(self.state.nb_nodes)
+
+    def _energy(self, sender, d):
+        return np.where(d <= self.d0[sender], self.et[sender] + self.efs[sender] * d ** 2,
+                        self.et[sender] + self.emp[sender] * d ** 4)
+
+    def refresh(self):
+        routing = self.net.get_routing()
+        if self.routing_version == routing.version:
+            return
+        self.routing_version = routing.version
+        senders = np.flatnonzero(routing.parent >= 0)
+        d = np.sqrt(np.sum((self.state.location[senders] - routing.parent_locations()[senders]) ** 2, axis=1))
+        self.parent_cost[:] = 0
+        self.parent_cost[senders] = self._energy(senders, d)
+
+    def parent_costs(self):
+        """
+        :return: mảng năng lượng/bit để mỗi nút gửi tới nút nhận hiện tại (0 nếu không có)
+        """
+        self.refresh()
+        return self.parent_cost
+
+    def to_parent(self, sender):
+        self.refresh()
+        return self.parent_cost.item(sender)
@@ -3,16 +3,22 @@ import numpy as np
 from scipy.spatial import distance
 
 import optimizer
-from physical_env.network.utils import network_clustering, network_cluster_id_node
+from physical_env.network.utils import ClusterLayout
+from physical_env.network.NetworkState import NetworkState
+from physical_env.network.SpatialIndex import SpatialIndex
+from physical_env.network.RoutingTree import RoutingTree
+from physical_env.network.LinkCost import LinkCostTable
+from physical_env.network.EnergyModel import AnalyticEnergyModel, DiscreteEnergyModel
 
 
 class Network:
-    def __init__(self, env, listNodes, baseStation, listTargets, mc_list=None, max_time=None):
+    def __init__(self, env, listNodes, baseStation, listTargets, mc_list=None, max_time=None, energy_mode="discrete",
+                 consumption_window=10, state=None):
         self.env = env
         self.listNodes = listNodes
         self.baseStation = baseStation
         self.listTargets = listTargets
-        self.targets_active = [1 for _ in range(len(self.listTargets))]
+        self.targets_active = np.ones(len(self.listTargets), dtype=np.int64)
         self.alive = 1
         baseStation.env = self.env
         baseStation.net = self
@@ -20,67 +26,101 @@ class Network:
         self.mc_list = mc_list
         self.network_cluster = []
         self.network_cluster_id_node = []
-
-        self.frame = np.array([self.baseStation.location[0], self.baseStation.location[0], self.baseStation.location[1],
-                               self.baseStation.location[1]], np.float64)
-        it = 0
-        for node in self.listNodes:
+        self.cluster_layout = None
+        self.spatial_index = None
+        self.routing = None
+        self.link_cost = None
+        self.energy_mode = energy_mode
+        self.energy_model = None
+        self.topology_ready = False
+        # Sự kiện đánh thức các MC đang rảnh khi có yêu cầu sạc mới.
+        self.request_event = env.event()
+        # Thời điểm của lần đánh thức gần nhất: mọi MC đang chờ sẽ quyết định tại thời điểm này.
+        self.request_time = None
+
+        for it, node in enumerate(self.listNodes):
             node.id = it
             node.env = self.env
             node.net = self
-            it += 1
-            self.frame[0] = min(self.frame[0], node.location[0])
-            self.frame[1] = max(self.frame[1], node.location[0])
-            self.frame[2] = min(self.frame[2], node.location[1])
-            self.frame[3] = max(self.frame[3], node.location[1])
+        # Các nút tạo bằng Node.from_state đã là khung nhìn lên bảng trạng thái chung.
+        if state is None:
+            state = NetworkState.from_nodes(self.listNodes, window=consumption_window)
+            for node in self.listNodes:
+                node.bind(state, node.id)
+        self.state = state
+
+        self.frame = np.array([self.baseStation.location[0], self.baseStation.location[0], self.baseStation.location[1],
+                               self.baseStation.location[1]], np.float64)
+        if len(self.listNodes):
+            self.frame[0] = min(self.frame[0], self.state.location[:, 0].min())
+            self.frame[1] = max(self.frame[1], self.state.location[:, 0].max())
+            self.frame[2] = min(self.frame[2], self.state.location[:, 1].min())
+            self.frame[3] = max(self.frame[3], self.state.location[:, 1].max())
         self.nodes_density = len(self.listNodes) / ((self.frame[1] - self.frame[0]) * (self.frame[3] - self.frame[2]))
-        it = 0
 
-        for target in listTargets:
+        for it, target in enumerate(listTargets):
             target.id = it
-            it += 1
-            
-    def setLevels(self):
+
+    def get_spatial_index(self):
+        if self.spatial_index is None:
+            self.spatial_index = SpatialIndex(self.state.location, self.state.com_range, self.state.sen_range,
+                                              [target.location for target in self.listTargets],
+                                              self.baseStation.location)
+        return self.spatial_index
+
+    def probe_topology(self):
         for node in self.listNodes:
-            node.level = -1
-        tmp1 = []
-        tmp2 = []
-        for node in self.baseStation.direct_nodes:
-            if node.status == 1:
-                node.level = 1
-                tmp1.append(node)
+            node.probe_neighbors()
+            node.probe_targets()
+        self.baseStation.probe_neighbors()
+        self.topology_ready = True
+
+    def get_routing(self):
+        if self.routing is None:
+            self.routing = RoutingTree(self)
+            self.targets_active = self.routing.targets_active
+        return self.routing
+
+    def get_link_cost(self):
+        if self.link_cost is None:
+            self.link_cost = LinkCostTable(self)
+        return self.link_cost
 
-        for i in range(len(self.targets_active)):
-            self.targets_active[i] = 0
+    def setLevels(self):
+        self.get_routing()
 
-        while True:
-            if len(tmp1) == 0:
-                break
-            for node in tmp1:
-                for target in node.listTargets:
-                    self.targets_active[target.id] = 1
-                for neighbor in node.neighbors:
-                    if neighbor.status == 1 and neighbor.level == -1:
-                        tmp2.append(neighbor)
-                        neighbor.level = node.level + 1
-
-            tmp1 = tmp2[:]
-            tmp2.clear()
-        return
+    def notify_energy_change(self):
+        if self.energy_model is not None:
+            self.energy_model.notify()
+
+    def signal_request(self):
+        """
+        Đánh thức các MC đang chờ yêu cầu sạc mới.
+        """
+        event, self.request_event = self.request_event, self.env.event()
+        self.request_time = self.env.now
+        event.succeed()
+
+    def nodes_died(self, node_ids):
+        if self.routing is not None:
+            self.routing.remove_nodes(node_ids)
 
     def reset(self):
-        for node in self.listNodes:
-            node.energy = 30000
+        self.state.energy[:] = 30000
         for mc in self.mc_list:
             mc.reset()
 
     def operate(self, t=1, optimizer=None):
-        request_id = []
-        for node in self.listNodes:
-            self.env.process(node.operate(t=t))
+        self.probe_topology()
+        if self.energy_mode == "analytic":
+            self.energy_model = AnalyticEnergyModel(self, t=t)
+        else:
+            self.energy_model = DiscreteEnergyModel(self, t=t)
+        self.env.process(self.energy_model.operate(t=t))
         self.env.process(self.baseStation.operate(t=t))
         first_step = 0
         energy_warning = self.listNodes[0].threshold * 30
+        mc_started = False
 
         while True:
             yield self.env.timeout(t / 10.0)
@@ -88,32 +128,24 @@ class Network:
             self.alive = self.check_targets()
             if not self.network_cluster:
                 yield self.env.timeout(10)
-                self.network_cluster = network_clustering(network=self)
-                self.network_cluster_id_node = network_cluster_id_node(network=self)
+                # Bộ tối ưu đã học trên một tập vị trí sạc (tải từ checkpoint) thì dùng lại tập đó.
+                layout = getattr(optimizer, "layout", None)
+                self.set_cluster_layout(layout if layout is not None else ClusterLayout.of(self))
                 optimizer.action_list = self.network_cluster
             yield self.env.timeout(9.0 * t / 10.0)
-            for index, node in enumerate(self.listNodes):
-                if node.energy <= energy_warning:
-                    node.request(optimizer=optimizer, t=t)
-                    request_id.append(index)
-                else:
-                    node.is_request = False
-            arr_active_mc = []
-            for mc in self.mc_list:
-                if mc.cur_action_type == "deactive":
-                    arr_active_mc.append(0)
-                else:
-                    arr_active_mc.append(1)
-            a = 0
-            b = 0
-            len_list_request_before = len(optimizer.list_request)
-            if optimizer and self.alive:
+            self.energy_model.sync()
+            # Mỗi MC là một tiến trình riêng, chỉ thức dậy khi tới nơi, hết thời gian sạc hoặc có yêu cầu mới.
+            if optimizer and self.alive and not mc_started:
                 for mc in self.mc_list:
-                    mc.runv2(network=self, time_stem=self.env.now, net=self, optimizer=optimizer)
-                    if mc.cur_action_type == "charging":
-                        for node_id in mc.target_nodes:
-                            node = self.listNodes[node_id]
-                            print(f"Node {node_id} is being charged by MC.")
+                    self.env.process(mc.operate(self, optimizer))
+                mc_started = True
+            warning = self.state.energy <= energy_warning
+            self.state.is_request[~warning] = False
+            requesting = np.flatnonzero(warning & ~self.state.is_request)
+            for index in requesting:
+                self.listNodes[index].request(optimizer=optimizer, t=t)
+            if len(requesting):
+                self.signal_request()
             if self.alive == 0:
                 break
             dead_nodes = self.get_dead_nodes()
@@ -123,47 +155,41 @@ class Network:
                     print(f"Node {node_info['id']} - Năng lượng: {node_info['energy']}")
         return
 
+    def set_cluster_layout(self, layout):
+        """
+        Dùng một kết quả phân cụm cho mạng (vị trí sạc và các nút của từng cụm).
+        Nếu được gọi trước operate, mạng sẽ không tự phân cụm nữa.
+        :param layout: ClusterLayout
+        """
+        self.cluster_layout = layout
+        self.network_cluster = list(layout.charging_pos)
+        self.network_cluster_id_node = [list(centers) for centers in layout.members]
+        # MC chưa quyết định lần nào bắt đầu ở trạng thái 30; với ít vị trí sạc hơn, nó bắt đầu ở trạng thái
+        # nghỉ (trạm cơ sở, vị trí cuối cùng) thay vì trỏ ra ngoài bảng Q.
+        for mc in self.mc_list or []:
+            mc.state = min(mc.state, len(self.network_cluster) - 1)
+
     def delete_request(self, id_cluster, optimizer):
-        for i, item in enumerate(optimizer.list_request):
-            for id_node in self.network_cluster_id_node[id_cluster]:
-                if item['id'] == id_node:
-                    del optimizer.list_request[i]
-                    break
+        optimizer.list_request.remove_nodes(self.network_cluster_id_node[id_cluster])
 
     def check_cluster(self, id_node):
-        for id_cluster, cluster in enumerate(self.network_cluster_id_node):
-            for node_cluster in cluster:
-                if node_cluster == id_node:
-                    return id_cluster
+        if self.cluster_layout is None:
+            return None
+        return self.cluster_layout.cluster_of(id_node)
 
     def check_targets(self):
-        return min(self.targets_active)
+        if len(self.targets_active) == 0:
+            return 1
+        return int(self.targets_active.min())
 
     def check_nodes(self):
-        tmp = 0
-        for node in self.listNodes:
-            if node.status == 0:
-                tmp += 1
-        return tmp
+        return self.state.count_dead()
 
     def avg_network(self):
-        sum = 0
-        for node in self.listNodes:
-            sum += node.energy
-        return sum / len(self.listNodes)
+        return self.state.avg_energy()
 
     def min_node(self):
-        id_node_min = -1
-        min_energy = 1000000000
-        for id, node in enumerate(self.listNodes):
-            if node.energy < min_energy:
-                min_energy = node.energy
-                id_node_min = id
-        return id_node_min
-    
+        return self.state.min_energy_id()
+
     def get_dead_nodes(self):
-        dead_nodes = []
-        for node in self.listNodes:
-            if node.status == 0:
-                dead_nodes.append({"id": node.id, "energy": node.energy})
-        return dead_nodes
\ No newline at end of file
+        return [{"id": int(index), "energy": self.state.energy[index]} for index in self.state.dead_ids()]
@@ -1,4 +1,3 @@
-import copy
 import simpy
 import yaml
 import random
@@ -10,28 +9,35 @@ from BaseStation import BaseStation
 from Network import Network
 from Node import Node
 from Target import Target
+from physical_env.network.NetworkState import NetworkState
+from physical_env.network.ScenarioCache import ScenarioCache
 
 class NetworkIO:
-    def __init__(self, file_data):
-        with open(file_data, 'r') as file:
-            self.net_argc = yaml.safe_load(file)
+    def __init__(self, file_data, cache=True):
+        """
+        :param file_data: đường dẫn tệp kịch bản YAML
+        :param cache: đọc kịch bản qua bộ đệm nhị phân (ScenarioCache) thay vì phân tích YAML
+        """
+        if cache:
+            self.net_argc = ScenarioCache().load(file_data)
+        else:
+            with open(file_data, 'r') as file:
+                self.net_argc = yaml.safe_load(file)
 
-    def makeNetwork(self):
-        net_argc = copy.deepcopy(self.net_argc)
+    def makeNetwork(self, energy_mode="discrete"):
+        # Các nút là khung nhìn lên một NetworkState dựng từ mảng tọa độ; tọa độ được sao chép một lần
+        # trong from_spec để việc ghi vào mạng không lọt sang net_argc (và các episode sau).
+        net_argc = self.net_argc
         self.node_phy_spe = net_argc["node_phy_spe"]
         self.seed = net_argc["seed"]
         np.random.seed(self.seed)
         random.seed(self.seed)
-        listNodes = []
-        listTargets = []
-        listEnergys = []
-        for tmp in self.net_argc["energy_avg"]:
-            listEnergys.append(tmp)
-        for id, tmp in enumerate(net_argc["nodes"]):
-            listNodes.append(Node(location=tmp, phy_spe=copy.deepcopy(self.node_phy_spe), energy_per_second=listEnergys[id]))
-        for tmp in self.net_argc["targets"]:
-            listTargets.append(Target(location=tmp))
+        state = NetworkState.from_spec(np.asarray(net_argc["nodes"], dtype=np.float64).reshape(-1, 2),
+                                       self.node_phy_spe)
+        listNodes = [Node.from_state(state, row, self.node_phy_spe) for row in range(state.nb_nodes)]
+        listTargets = [Target(location=tmp) for tmp in np.asarray(net_argc["targets"], dtype=np.float64).tolist()]
 
         baseStation = BaseStation(location=net_argc["base_station"])
         env = simpy.Environment()
-        return env, Network(env, listNodes, baseStation, listTargets, net_argc["max_time"])
\ No newline at end of file
+        return env, Network(env, listNodes, baseStation, listTargets, max_time=net_argc["max_time"],
+                            energy_mode=energy_mode, state=state)
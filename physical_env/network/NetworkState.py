@@ -0,0 +1,146 @@
+import numpy as np
+
+
+class NetworkState:
+    """
+    Trạng thái của tất cả các nút trong mạng, lưu dưới dạng các mảng NumPy liền kề
+    (mỗi nút là một hàng). Node chỉ là một khung nhìn (view) lên một hàng của bảng này,
+    nhờ đó các phép thống kê mỗi tick được thực hiện bằng phép toán vector.
+    """
+
+    def __init__(self, nb_nodes, window=10):
+        """
+        :param nb_nodes: số lượng nút trong mạng
+        :param window: số giây của cửa sổ trượt dùng để ước lượng energyCS
+        """
+        self.nb_nodes = nb_nodes
+        self.location = np.zeros((nb_nodes, 2), dtype=np.float64)
+        self.energy = np.zeros(nb_nodes, dtype=np.float64)
+        self.capacity = np.zeros(nb_nodes, dtype=np.float64)
+        self.threshold = np.zeros(nb_nodes, dtype=np.float64)
+        self.com_range = np.zeros(nb_nodes, dtype=np.float64)
+        self.sen_range = np.zeros(nb_nodes, dtype=np.float64)
+        self.status = np.ones(nb_nodes, dtype=np.int8)
+        self.level = np.full(nb_nodes, -1, dtype=np.int64)
+        self.energyCS = np.zeros(nb_nodes, dtype=np.float64)
+        self.energyRR = np.zeros(nb_nodes, dtype=np.float64)
+        # Năng lượng tích lũy nút thực sự nhận từ các MC (sau khi chặn theo capacity) trên mỗi đơn vị energyRR.
+        self.charge_yield = np.zeros(nb_nodes, dtype=np.float64)
+        self.radius = np.zeros(nb_nodes, dtype=np.float64)
+        self.log_energy = np.zeros(nb_nodes, dtype=np.float64)
+        self.is_request = np.zeros(nb_nodes, dtype=bool)
+        # Bộ đệm vòng chứa log_energy của `window` giây gần nhất cho từng nút.
+        self.window = window
+        self.log_window = np.zeros((nb_nodes, window), dtype=np.float64)
+        self.log_pos = np.zeros(nb_nodes, dtype=np.int64)
+        self.log_len = np.zeros(nb_nodes, dtype=np.int64)
+
+    @classmethod
+    def from_nodes(cls, nodes, window=10):
+        """
+        Gom trạng thái của các nút (mỗi nút đang giữ bảng riêng của nó) vào một bảng chung.
+        :param nodes: danh sách các nút
+        :param window: số giây của cửa sổ trượt dùng để ước lượng energyCS
+        :return: NetworkState
+        """
+        state = cls(len(nodes), window=window)
+        for row, node in enumerate(nodes):
+            src, src_row = node.state, node.row
+            for field in cls.fields():
+                getattr(state, field)[row] = getattr(src, field)[src_row]
+        return state
+
+    @classmethod
+    def from_spec(cls, location, phy_spe, window=10):
+        """
+        Tạo trạng thái của các nút có cùng thông số vật lý trực tiếp từ mảng tọa độ, không qua từng nút.
+        :param location: mảng (N, 2) tọa độ các nút, được sao chép một lần (mảng nguồn có thể là memmap
+            copy-on-write của ScenarioCache dùng chung giữa các episode)
+        :param phy_spe: thông số vật lý chung của các nút (node_phy_spe)
+        :param window: số giây của cửa sổ trượt dùng để ước lượng energyCS
+        :return: NetworkState
+        """
+        state = cls(len(location), window=window)
+        state.location = np.array(location, dtype=np.float64, copy=True)
+        state.energy[:] = phy_spe['capacity']
+        state.capacity[:] = phy_spe['capacity']
+        state.threshold[:] = phy_spe['threshold']
+        state.com_range[:] = phy_spe['com_range']
+        state.sen_range[:] = phy_spe['sen_range']
+        return state
+
+    @staticmethod
+    def fields():
+        return ("location", "energy", "capacity", "threshold", "com_range", "sen_range", "status", "level",
+                "energyCS", "energyRR", "charge_yield", "radius", "log_energy", "is_request")
+
+    def update_consumption(self, rows, alpha, beta):
+        """
+        Đưa log_energy của giây vừa qua vào cửa sổ trượt của các nút `rows`, cập nhật energyCS
+        (trung bình trượt) và bán kính sạc. Bán kính chỉ được tính lại ở những nút có energyCS thay đổi.
+        :param rows: chỉ số các nút
+        :param alpha: hằng số alpha của các nút rows
+        :param beta: hằng số beta của các nút rows
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        length = self.log_len[rows]
+        pos = self.log_pos[rows]
+        new = self.log_energy[rows]
+        old = self.energyCS[rows]
+        full = length >= self.window
+        oldest = np.where(full, self.log_window[rows, pos], 0)
+        energyCS = (old * length - oldest + new) / np.where(full, length, length + 1)
+
+        self.log_window[rows, pos] = new
+        self.log_pos[rows] = (pos + 1) % self.window
+        self.log_len[rows] = np.minimum(length + 1, self.window)
+        self.energyCS[rows] = energyCS
+
+        # Khi cửa sổ chưa đầy, bán kính được tính với mọi energyCS khác 0; sau đó chỉ với energyCS > 0.
+        changed = np.where(full, energyCS > 0, energyCS != 0) & ((energyCS != old) | (length == 0))
+        alpha = np.broadcast_to(alpha, rows.shape)[changed]
+        beta = np.broadcast_to(beta, rows.shape)[changed]
+        self.radius[rows[changed]] = np.sqrt(alpha / energyCS[changed]) - beta
+
+    def alive(self):
+        return self.status == 1
+
+    def count_dead(self):
+        return int(np.count_nonzero(self.status == 0))
+
+    def dead_ids(self):
+        return np.flatnonzero(self.status == 0)
+
+    def avg_energy(self):
+        return float(np.mean(self.energy))
+
+    def min_energy_id(self):
+        if self.nb_nodes == 0:
+            return -1
+        return int(np.argmin(self.energy))
+
+
+def node_constants(nodes, name):
+    """
+    Gom một hằng số vật lý của từng nút (er, et, efs, ...) thành một mảng.
+    """
+    return np.array([getattr(node, name) for node in nodes], dtype=np.float64)
+
+
+def row_property(field, scalar=True):
+    """
+    Tạo thuộc tính của Node đọc/ghi trực tiếp vào hàng tương ứng trong NetworkState.
+    :param field: tên mảng trong NetworkState
+    :param scalar: trả về số Python thay vì một view của hàng
+    """
+    if scalar:
+        def fget(self):
+            return getattr(self.state, field).item(self.row)
+    else:
+        def fget(self):
+            return getattr(self.state, field)[self.row]
+
+    def fset(self, value):
+        getattr(self.state, field)[self.row] = value
+
+    return property(fget, fset)
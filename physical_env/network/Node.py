@@ -6,15 +6,31 @@ import sys
 import os
 
 from physical_env.network.utils import request_function
+from physical_env.network.NetworkState import NetworkState, row_property
 
 sys.path.append(os.path.dirname(__file__))
 from Package import Package
 
 
 class Node:
+    location = row_property("location", scalar=False)
+    energy = row_property("energy")
+    threshold = row_property("threshold")
+    capacity = row_property("capacity")
+    com_range = row_property("com_range")
+    sen_range = row_property("sen_range")
+    status = row_property("status")
+    level = row_property("level")
+    energyCS = row_property("energyCS")
+    energyRR = row_property("energyRR")
+    radius = row_property("radius")
+    log_energy = row_property("log_energy")
+    is_request = row_property("is_request")
+
     def __init__(self, location, phy_spe, energy_per_second):
         self.env = None
         self.net = None
+        self.bind(NetworkState(1), 0)
 
         self.location = np.array(location)
         self.energy = phy_spe['capacity']
@@ -35,25 +51,59 @@ class Node:
         self.energyCS = 0
 
         self.id = None
-        self.level = None
+        self.level = -1
         self.status = 1
         self.neighbors = []
         self.listTargets = []
-        self.log = []
         self.log_energy = 0
         self.check_status()
         self.energy_per_second = 0
         self.radius = 0
         self.is_request = False
 
+    @classmethod
+    def from_state(cls, state, row, phy_spe):
+        """
+        Tạo nút là khung nhìn lên một hàng đã được điền sẵn của NetworkState (xem NetworkState.from_spec),
+        không khởi tạo bảng trạng thái riêng cho nút.
+        :param state: bảng trạng thái của mạng
+        :param row: chỉ số hàng của nút
+        :param phy_spe: thông số vật lý của nút
+        :return: Node
+        """
+        node = cls.__new__(cls)
+        node.env = None
+        node.net = None
+        node.bind(state, row)
+        node.prob_gp = phy_spe['prob_gp']
+        node.package_size = phy_spe['package_size']
+        node.er = phy_spe['er']
+        node.et = phy_spe['et']
+        node.efs = phy_spe['efs']
+        node.emp = phy_spe['emp']
+        node.alpha = phy_spe['alpha']
+        node.beta = phy_spe['beta']
+        node.id = None
+        node.neighbors = []
+        node.listTargets = []
+        node.energy_per_second = 0
+        return node
+
+    def bind(self, state, row):
+        """
+        Gắn nút vào một hàng của NetworkState
+        :param state: bảng trạng thái của mạng
+        :param row: chỉ số hàng của nút
+        """
+        self.state = state
+        self.row = row
+
     def operate(self, t=1):
         """
         Hoạt động của một nút
         :param t:
         :trả về t(s) cho hệ thống quản lý thời gian mỗi t(s)
         """
-        self.probe_targets()
-        self.probe_neighbors()
         while True:
             self.log_energy = 0
 
@@ -68,61 +118,42 @@ class Node:
             if self.status == 0:
                 break
             self.energy = min(self.energy + self.energyRR * t * 0.5, self.capacity)
-
-            len_log = len(self.log)
-            if len_log < 10:
-                self.log.append(self.log_energy)
-                self.energyCS = (self.energyCS * len_log + self.log_energy) / (len_log + 1)
-                self.energy_per_second = self.energyCS
-                if self.energyCS:
-                    self.radius = np.sqrt(self.alpha / self.energy_per_second) - self.beta
-            else:
-                self.energyCS = (self.energyCS * len_log - self.log[0] + self.log_energy) / len_log
-                del self.log[0]
-                self.log.append(self.log_energy)
-                self.energy_per_second = self.energyCS
-                if self.energyCS >= 0:
-                    self.radius = np.sqrt(self.alpha / self.energyCS) - self.beta
+            self.update_consumption()
         return
 
+    def update_consumption(self):
+        """
+        Cập nhật log năng lượng tiêu thụ, energyCS (trung bình trượt trên 10 giây gần nhất)
+        và bán kính sạc của nút sau mỗi giây
+        """
+        self.state.update_consumption([self.row], self.alpha, self.beta)
+        self.energy_per_second = self.energyCS
+
     def probe_neighbors(self):
-        self.neighbors.clear()
-        for node in self.net.listNodes:
-            if self != node and euclidean(node.location, self.location) <= self.com_range:
-                self.neighbors.append(node)
+        index = self.net.get_spatial_index()
+        self.neighbors[:] = [self.net.listNodes[j] for j in index.neighbors_of(self.id)]
 
     def probe_targets(self):
-        self.listTargets.clear()
-        for target in self.net.listTargets:
-            if euclidean(self.location, target.location) <= self.sen_range:
-                self.listTargets.append(target)
+        index = self.net.get_spatial_index()
+        self.listTargets[:] = [self.net.listTargets[j] for j in index.targets_of(self.id)]
 
     def find_receiver(self):
-        if not (self.status == 1):
-            return None
-        candidates = [node for node in self.neighbors
-                      if node.level < self.level and node.status == 1]
-
-        if len(candidates) > 0:
-            distances = [euclidean(candidate.location, self.location) for candidate in candidates]
-            return candidates[np.argmin(distances)]
-        else:
+        receiver = self.net.get_routing().receiver(self.id)
+        if receiver is self.net.baseStation:
             return None
+        return receiver
 
     def generate_packages(self):
         for target in self.listTargets:
             self.send_package(Package(target.id, self.package_size))
 
     def send_package(self, package):
-        d0 = (self.efs / self.emp) ** 0.5
-        if euclidean(self.location, self.net.baseStation.location) > self.com_range:
-            receiver = self.find_receiver()
-        else:
+        if self.net.get_routing().is_direct[self.id]:
             receiver = self.net.baseStation
+        else:
+            receiver = self.find_receiver()
         if receiver is not None:
-            d = euclidean(self.location, receiver.location)
-            e_send = ((self.et + self.efs * d ** 2) if d <= d0
-                      else (self.et + self.emp * d ** 4)) * package.package_size
+            e_send = self.net.get_link_cost().to_parent(self.id) * package.package_size
             if self.energy - self.threshold < e_send:
                 self.energy = self.threshold
             else:
@@ -132,19 +163,16 @@ class Node:
         self.check_status()
 
     def count_energyCS_per_second(self):
-        self.probe_targets()
-        self.probe_neighbors()
+        if not self.net.topology_ready:
+            self.net.probe_topology()
         for target in self.listTargets:
             package = Package(target.id, self.package_size)
-            d0 = (self.efs / self.emp) ** 0.5
-            if euclidean(self.location, self.net.baseStation.location) > self.com_range:
-                receiver = self.find_receiver()
-            else:
+            if self.net.get_routing().is_direct[self.id]:
                 receiver = self.net.baseStation
+            else:
+                receiver = self.find_receiver()
             if receiver is not None:
-                d = euclidean(self.location, receiver.location)
-                e_send = ((self.et + self.efs * d ** 2) if d <= d0
-                          else (self.et + self.emp * d ** 4)) * package.package_size
+                e_send = self.net.get_link_cost().to_parent(self.id) * package.package_size
                 self.energy_per_second += e_send
                 e_receive = self.er * package.package_size
                 self.energy_per_second += e_receive
@@ -166,6 +194,7 @@ class Node:
         tmp = mc.alpha / (euclidean(self.location, mc.location) + mc.beta) ** 2
         self.energyRR += tmp
         mc.chargingRate += tmp
+        self.net.notify_energy_change()
 
     def charger_disconnection(self, mc):
         if self.status == 0:
@@ -173,6 +202,7 @@ class Node:
         tmp = mc.alpha / (euclidean(self.location, mc.location) + mc.beta) ** 2
         self.energyRR -= tmp
         mc.chargingRate -= tmp
+        self.net.notify_energy_change()
 
     def request(self, optimizer, t, request_func=request_function):
         """
@@ -189,8 +219,11 @@ class Node:
 
     def check_status(self):
         if self.energy <= self.threshold:
+            was_alive = self.status == 1
             self.status = 0
             self.energyCS = 0
+            if was_alive and self.net is not None:
+                self.net.nodes_died([self.id])
 
     def __str__(self):
         return f"Node(id='{self.id}', location={self.location})"
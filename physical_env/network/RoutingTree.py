@@ -0,0 +1,192 @@
+import heapq
+import numpy as np
+
+
+def gather_csr(indptr, indices, rows):
+    """
+    Lấy toàn bộ phần tử của các hàng `rows` trong một ma trận CSR.
+    :return: (chỉ số hàng nguồn, vị trí trong indices) của từng phần tử
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    lengths = indptr[rows + 1] - indptr[rows]
+    sources = np.repeat(rows, lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return sources, np.repeat(indptr[rows], lengths) + offsets
+
+
+class RoutingTree:
+    """
+    Cây định tuyến về trạm cơ sở. Mức (level) của mỗi nút là số bước nhảy tối thiểu tới trạm
+    cơ sở, và parent là nút nhận gói tin tiếp theo (nút hàng xóm gần nhất có mức thấp hơn).
+    Cây được tính một lần và chỉ sửa cục bộ trên cây con bị ảnh hưởng khi có nút chết.
+
+    parent[i] == nb_nodes nghĩa là nút i gửi thẳng về trạm cơ sở, -1 nghĩa là không có nút nhận.
+    """
+
+    def __init__(self, net):
+        """
+        :param net: mạng chứa NetworkState và SpatialIndex
+        """
+        self.net = net
+        self.state = net.state
+        self.index = net.get_spatial_index()
+        self.nb_nodes = self.state.nb_nodes
+        self.base_station = self.nb_nodes
+        self.parent = np.full(self.nb_nodes, -1, dtype=np.int64)
+        # Nút đã "phát hiện" ra mức của nút i khi duyệt BFS, dùng để tìm cây con bị ảnh hưởng.
+        self.bfs_parent = np.full(self.nb_nodes, -1, dtype=np.int64)
+        self.is_direct = np.zeros(self.nb_nodes, dtype=bool)
+        self.is_direct[self.index.direct_nodes] = True
+        self.reverse_indptr, self.reverse_indices = self.index.reverse_neighbors()
+        self.targets_active = np.zeros(len(self.index.target_locations), dtype=np.int64)
+        self.version = 0
+        self.build()
+
+    def build(self):
+        level = self.state.level
+        alive = self.state.status == 1
+        level[:] = -1
+        self.bfs_parent[:] = -1
+        frontier = self.index.direct_nodes[alive[self.index.direct_nodes]]
+        level[frontier] = 1
+        while len(frontier):
+            sources, positions = gather_csr(self.index.neighbor_indptr, self.index.neighbor_indices, frontier)
+            found = self.index.neighbor_indices[positions]
+            fresh = alive[found] & (level[found] == -1)
+            found, sources = found[fresh], sources[fresh]
+            found, first = np.unique(found, return_index=True)
+            level[found] = level[sources[first]] + 1
+            self.bfs_parent[found] = sources[first]
+            frontier = found
+        self.parent[:] = -1
+        self._update_parents(np.arange(self.nb_nodes))
+        self._update_targets()
+
+    def _update_parents(self, rows):
+        """
+        Chọn lại nút nhận cho các nút `rows` theo đúng quy tắc của Node.find_receiver:
+        hàng xóm còn sống có mức thấp hơn và gần nhất.
+        """
+        level = self.state.level
+        alive = self.state.status == 1
+        rows = np.asarray(rows, dtype=np.int64)
+        self.parent[rows] = -1
+        direct = rows[self.is_direct[rows] & alive[rows]]
+        self.parent[direct] = self.base_station
+        rows = rows[~self.is_direct[rows] & alive[rows]]
+        sources, positions = gather_csr(self.index.neighbor_indptr, self.index.neighbor_indices, rows)
+        candidates = self.index.neighbor_indices[positions]
+        valid = alive[candidates] & (level[candidates] < level[sources])
+        sources, candidates = sources[valid], candidates[valid]
+        distances = self.index.neighbor_distances[positions[valid]]
+        order = np.lexsort((candidates, distances, sources))
+        sources, candidates = sources[order], candidates[order]
+        rows, first = np.unique(sources, return_index=True)
+        self.parent[rows] = candidates[first]
+        self.version += 1
+
+    def _update_targets(self):
+        reached = np.flatnonzero(self.state.level != -1)
+        _, positions = gather_csr(self.index.target_indptr, self.index.target_indices, reached)
+        covered = np.bincount(self.index.target_indices[positions], minlength=len(self.targets_active))
+        self.targets_active[:] = covered > 0
+
+    def subtree(self, roots, parent):
+        """
+        Tập các nút có chuỗi `parent` đi qua một trong các nút `roots` (kể cả roots).
+        """
+        members = np.zeros(self.nb_nodes, dtype=bool)
+        frontier = np.asarray(roots, dtype=np.int64)
+        members[frontier] = True
+        while len(frontier):
+            children = np.flatnonzero((parent >= 0) & (parent < self.nb_nodes))
+            children = children[members[parent[children]] & ~members[children]]
+            members[children] = True
+            frontier = children
+        return np.flatnonzero(members)
+
+    def remove_nodes(self, dead):
+        """
+        Sửa cây định tuyến cục bộ sau khi các nút `dead` chết.
+        Chỉ các nút có đường BFS đi qua nút chết mới phải tính lại mức; các nút khác giữ nguyên
+        mức vì khoảng cách tới trạm cơ sở không thể giảm khi mạng mất nút.
+        """
+        dead = np.asarray(dead, dtype=np.int64)
+        if len(dead) == 0:
+            return
+        level = self.state.level
+        alive = self.state.status == 1
+        affected = self.subtree(dead, self.bfs_parent)
+        level[affected] = -1
+        self.bfs_parent[affected] = -1
+        in_affected = np.zeros(self.nb_nodes, dtype=bool)
+        in_affected[affected] = True
+
+        # Gieo mức cho các nút bị ảnh hưởng từ những hàng xóm nằm ngoài cây con.
+        heap = []
+        repair = affected[alive[affected]]
+        sources, positions = gather_csr(self.reverse_indptr, self.reverse_indices, repair)
+        senders = self.reverse_indices[positions]
+        valid = alive[senders] & ~in_affected[senders] & (level[senders] > 0)
+        for node, sender in zip(sources[valid], senders[valid]):
+            if level[node] == -1 or level[sender] + 1 < level[node]:
+                level[node] = level[sender] + 1
+                self.bfs_parent[node] = sender
+                heapq.heappush(heap, (level[node], node))
+        while heap:
+            node_level, node = heapq.heappop(heap)
+            if node_level != level[node]:
+                continue
+            for neighbor in self.index.neighbors_of(node):
+                if in_affected[neighbor] and alive[neighbor] and (level[neighbor] == -1 or
+                                                                  node_level + 1 < level[neighbor]):
+                    level[neighbor] = node_level + 1
+                    self.bfs_parent[neighbor] = node
+                    heapq.heappush(heap, (level[neighbor], neighbor))
+
+        # Nút nhận chỉ thay đổi ở các nút có hàng xóm chết hoặc đổi mức.
+        changed = np.union1d(dead, affected)
+        _, positions = gather_csr(self.reverse_indptr, self.reverse_indices, changed)
+        self._update_parents(np.union1d(changed, self.reverse_indices[positions]))
+        self._update_targets()
+
+    def forward_load(self, generated):
+        """
+        Lưu lượng gói tin trên cây định tuyến trong một tick.
+        :param generated: số gói tin mỗi nút tự sinh ra
+        :return: (sent, received) số gói mỗi nút gửi đi và nhận từ các nút con;
+                 nút không có nút nhận không gửi được gói nào
+        """
+        level = self.state.level
+        routed = self.parent >= 0
+        sent = np.where(routed, generated, 0).astype(np.float64)
+        received = np.zeros(self.nb_nodes, dtype=np.float64)
+        relays = np.flatnonzero(routed & (self.parent != self.base_station))
+        for node_level in np.unique(level[relays])[::-1]:
+            rows = relays[level[relays] == node_level]
+            np.add.at(received, self.parent[rows], sent[rows])
+            receivers = np.unique(self.parent[rows])
+            sent[receivers] = np.where(routed[receivers], generated[receivers] + received[receivers], 0)
+        return sent, received
+
+    def parent_locations(self):
+        """
+        :return: mảng (N, 2) tọa độ nút nhận của từng nút (NaN nếu không có)
+        """
+        locations = np.full((self.nb_nodes, 2), np.nan)
+        to_base = self.parent == self.base_station
+        to_node = (self.parent >= 0) & ~to_base
+        locations[to_base] = self.net.baseStation.location
+        locations[to_node] = self.state.location[self.parent[to_node]]
+        return locations
+
+    def receiver(self, node_id):
+        """
+        :return: nút nhận tiếp theo của nút node_id (Node, BaseStation hoặc None)
+        """
+        parent = self.parent[node_id]
+        if parent == self.base_station:
+            return self.net.baseStation
+        if parent < 0:
+            return None
+        return self.net.listNodes[parent]
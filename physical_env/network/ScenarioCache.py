@@ -0,0 +1,117 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+import yaml
+
+CACHE_VERSION = 1
+CACHE_DIR = ".scenario_cache"
+ARRAYS = ("nodes", "targets", "energy_avg")
+
+
+class ScenarioCache:
+    """
+    Bộ đệm nhị phân của các kịch bản mạng (YAML). Mỗi kịch bản được biên dịch một lần thành một thư mục
+    mang mã băm SHA-1 của tệp YAML, gồm các mảng .npy (nodes, targets, energy_avg) và meta.json
+    (các khóa còn lại của kịch bản). Khi tải, các mảng được ánh xạ bộ nhớ (copy-on-write) nên không
+    phải phân tích lại YAML hay sao chép dữ liệu; sửa tệp YAML sẽ đổi mã băm và kịch bản được biên dịch lại.
+    """
+    _hashes = {}
+
+    def __init__(self, root=None):
+        """
+        :param root: thư mục chứa bộ đệm; mặc định là thư mục .scenario_cache cạnh tệp kịch bản
+        """
+        self.root = root
+
+    @classmethod
+    def file_hash(cls, path):
+        """
+        :return: mã SHA-1 của tệp, được ghi nhớ theo (đường dẫn, thời điểm sửa, kích thước)
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        digest = cls._hashes.get(key)
+        if digest is None:
+            with open(path, 'rb') as file:
+                digest = hashlib.sha1(file.read()).hexdigest()
+            cls._hashes[key] = digest
+        return digest
+
+    def cache_dir(self, path):
+        root = self.root if self.root is not None else os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+        return os.path.join(root, self.file_hash(path))
+
+    def compile(self, path):
+        """
+        Biên dịch kịch bản YAML vào bộ đệm (bỏ qua nếu đã có).
+        :param path: đường dẫn tệp YAML
+        :return: thư mục bộ đệm của kịch bản
+        """
+        target = self.cache_dir(path)
+        if self.is_valid(target):
+            return target
+        with open(path, 'r') as file:
+            net_argc = yaml.safe_load(file)
+        tmp = "{}.tmp{}".format(target, os.getpid())
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in ARRAYS:
+            if name in net_argc:
+                np.save(os.path.join(tmp, name + ".npy"), np.asarray(net_argc[name], dtype=np.float64))
+        meta = {key: value for key, value in net_argc.items() if key not in ARRAYS}
+        meta["cache_version"] = CACHE_VERSION
+        meta["source"] = os.path.basename(path)
+        with open(os.path.join(tmp, "meta.json"), 'w') as file:
+            json.dump(meta, file)
+        shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            # Một tiến trình khác vừa biên dịch cùng kịch bản.
+            shutil.rmtree(tmp, ignore_errors=True)
+        return target
+
+    @staticmethod
+    def is_valid(target):
+        meta_path = os.path.join(target, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, 'r') as file:
+            return json.load(file).get("cache_version") == CACHE_VERSION
+
+    def load(self, path, mmap_mode='c'):
+        """
+        Tải kịch bản từ bộ đệm (biên dịch nếu chưa có).
+        :param path: đường dẫn tệp YAML
+        :param mmap_mode: chế độ np.load của các mảng; None để đọc toàn bộ vào bộ nhớ
+        :return: dict cùng các khóa với kịch bản YAML, các danh sách tọa độ là mảng NumPy
+        """
+        target = self.compile(path)
+        with open(os.path.join(target, "meta.json"), 'r') as file:
+            net_argc = json.load(file)
+        for name in ARRAYS:
+            array_path = os.path.join(target, name + ".npy")
+            if os.path.exists(array_path):
+                net_argc[name] = np.load(array_path, mmap_mode=mmap_mode)
+        return net_argc
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Biên dịch các kịch bản mạng YAML thành bộ đệm nhị phân.")
+    parser.add_argument("paths", nargs="*", help="các tệp YAML; mặc định là mọi kịch bản trong network_scenarios")
+    parser.add_argument("--root", default=None, help="thư mục chứa bộ đệm")
+    args = parser.parse_args(argv)
+    paths = args.paths or sorted(glob.glob(os.path.join(os.path.dirname(__file__), "network_scenarios", "*.yaml")) +
+                                 glob.glob(os.path.join("Data_WRSN", "network_scenarios", "*.yaml")))
+    cache = ScenarioCache(args.root)
+    for path in paths:
+        print("{} -> {}".format(path, cache.compile(path)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import argparse
+import math
+import os
+
+import numpy as np
+import yaml
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, minimum_spanning_tree, shortest_path
+from scipy.spatial import Delaunay, cKDTree
+
+DEFAULT_PHY_SPE = {
+    "capacity": 30000,
+    "com_range": 80.1,
+    "efs": 1.0e-08,
+    "emp": 1.3e-12,
+    "er": 0.0001,
+    "et": 5.0e-05,
+    "package_size": 400,
+    "prob_gp": 1,
+    "sen_range": 40.1,
+    "threshold": 540,
+    "alpha": 4500,
+    "beta": 30,
+}
+LAYOUTS = ("uniform", "clustered", "road")
+
+
+class ScenarioGenerator:
+    """
+    Sinh kịch bản mạng tổng hợp cùng lược đồ với các tệp trong network_scenarios (node_phy_spe, seed, max_time,
+    Rc, Rs, base_station, xllcorner, yllcorner, nodes, targets, energy_avg). Mọi bước đều là phép toán vector
+    trên toàn bộ các nút (KD-tree, đồ thị thưa), nên kịch bản 100k nút được sinh trong vài giây.
+
+    Kịch bản sinh ra luôn thỏa:
+    - mỗi mục tiêu nằm trong sen_range của ít nhất một nút;
+    - mọi nút đều có đường đi tới trạm cơ sở qua các liên kết dài không quá com_range (các nút chuyển tiếp
+      được chèn thêm trên đoạn nối các thành phần rời rạc, nên số nút có thể lớn hơn nb_nodes).
+    """
+
+    def __init__(self, nb_nodes, nb_targets=None, layout="uniform", size=None, degree=8.0, base_station=None,
+                 seed=0, phy_spe=None, max_time=604800, xllcorner=105.808725, yllcorner=21.015288,
+                 nb_clusters=None, spread=None, nb_roads=None, jitter=None, spacing=0.9):
+        """
+        :param nb_nodes: số lượng nút được rải theo bố cục (chưa kể các nút chuyển tiếp)
+        :param nb_targets: số lượng mục tiêu; mặc định bằng nb_nodes / 2 như các kịch bản có sẵn
+        :param layout: bố cục các nút: "uniform", "clustered" hoặc "road"
+        :param size: cạnh của vùng triển khai hình vuông; mặc định được chọn sao cho bậc trung bình xấp xỉ degree
+        :param degree: số hàng xóm trung bình mong muốn khi size không được chỉ định
+        :param base_station: tọa độ trạm cơ sở; mặc định là tâm vùng triển khai
+        :param seed: hạt giống ngẫu nhiên, được ghi vào kịch bản
+        :param phy_spe: thông số vật lý của các nút; mặc định là DEFAULT_PHY_SPE
+        :param max_time: thời gian mô phỏng tối đa
+        :param xllcorner: kinh độ góc dưới trái của vùng triển khai
+        :param yllcorner: vĩ độ góc dưới trái của vùng triển khai
+        :param nb_clusters: số cụm của bố cục "clustered"
+        :param spread: độ lệch chuẩn của mỗi cụm (bố cục "clustered")
+        :param nb_roads: số con đường của bố cục "road"
+        :param jitter: độ lệch chuẩn của nút so với trục đường (bố cục "road")
+        :param spacing: khoảng cách giữa các nút chuyển tiếp, tính theo tỉ lệ com_range (< 1)
+        """
+        if layout not in LAYOUTS:
+            raise ValueError("layout must be one of {}".format(LAYOUTS))
+        if not 0 < spacing < 1:
+            raise ValueError("spacing must be in (0, 1)")
+        self.phy_spe = dict(DEFAULT_PHY_SPE if phy_spe is None else phy_spe)
+        self.com_range = float(self.phy_spe["com_range"])
+        self.sen_range = float(self.phy_spe["sen_range"])
+        self.nb_nodes = int(nb_nodes)
+        self.nb_targets = max(1, self.nb_nodes // 2) if nb_targets is None else int(nb_targets)
+        self.layout = layout
+        if size is None:
+            size = math.sqrt(self.nb_nodes * math.pi * self.com_range ** 2 / degree)
+        self.size = float(size)
+        self.base_station = np.asarray([self.size / 2, self.size / 2] if base_station is None else base_station,
+                                       dtype=np.float64)
+        self.seed = seed
+        self.max_time = max_time
+        self.xllcorner = xllcorner
+        self.yllcorner = yllcorner
+        self.nb_clusters = nb_clusters or max(1, self.nb_nodes // 200)
+        self.spread = spread or 2 * self.com_range
+        self.nb_roads = nb_roads or max(2, int(math.sqrt(self.nb_nodes) / 8))
+        self.jitter = jitter or self.com_range / 4
+        self.spacing = spacing
+        self.rng = np.random.default_rng(seed)
+
+    def place_uniform(self, n):
+        return self.rng.uniform(0, self.size, size=(n, 2))
+
+    def place_clustered(self, n):
+        """
+        Các nút tập trung quanh nb_clusters tâm ngẫu nhiên (phân phối chuẩn với độ lệch chuẩn spread).
+        """
+        centers = self.rng.uniform(0, self.size, size=(self.nb_clusters, 2))
+        labels = self.rng.integers(0, self.nb_clusters, size=n)
+        points = centers[labels] + self.rng.normal(0, self.spread, size=(n, 2))
+        return np.clip(points, 0, self.size)
+
+    def place_road(self, n, nb_segments=8):
+        """
+        Các nút nằm dọc theo nb_roads con đường. Mỗi con đường là một đường gấp khúc nb_segments đoạn, đi
+        từ một điểm ngẫu nhiên theo hướng chính của nó; nút được chọn đều theo chiều dài rồi lệch ngang jitter.
+        """
+        start = self.rng.uniform(0, self.size, size=(self.nb_roads, 1, 2))
+        heading = self.rng.uniform(0, 2 * np.pi, size=(self.nb_roads, 1))
+        turns = heading + self.rng.normal(0, np.pi / 8, size=(self.nb_roads, nb_segments))
+        step = self.size / nb_segments
+        moves = step * np.stack([np.cos(turns), np.sin(turns)], axis=-1)
+        vertices = np.clip(np.concatenate([start, start + np.cumsum(moves, axis=1)], axis=1), 0, self.size)
+        a = vertices[:, :-1].reshape(-1, 2)
+        b = vertices[:, 1:].reshape(-1, 2)
+        length = np.sqrt(np.sum((b - a) ** 2, axis=1))
+        cumulative = np.cumsum(length)
+        segment = np.searchsorted(cumulative, self.rng.uniform(0, cumulative[-1], size=n), side="right")
+        segment = np.minimum(segment, len(a) - 1)
+        t = self.rng.uniform(0, 1, size=(n, 1))
+        points = a[segment] + (b[segment] - a[segment]) * t + self.rng.normal(0, self.jitter, size=(n, 2))
+        return np.clip(points, 0, self.size)
+
+    def place_nodes(self):
+        return getattr(self, "place_" + self.layout)(self.nb_nodes)
+
+    def link_graph(self, nodes):
+        """
+        Đồ thị liên kết (khoảng cách <= com_range) giữa các nút và trạm cơ sở (đỉnh cuối cùng).
+        :return: ma trận kề thưa (N + 1, N + 1)
+        """
+        n = len(nodes)
+        pairs = cKDTree(nodes).query_pairs(self.com_range, output_type="ndarray")
+        direct = np.flatnonzero(np.sqrt(np.sum((nodes - self.base_station) ** 2, axis=1)) <= self.com_range)
+        rows = np.concatenate([pairs[:, 0], direct])
+        cols = np.concatenate([pairs[:, 1], np.full(len(direct), n)])
+        graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n + 1, n + 1))
+        return graph.tocsr()
+
+    def connect(self, nodes):
+        """
+        Chèn nút chuyển tiếp để mọi nút nối được tới trạm cơ sở. Các thành phần rời rạc (kể cả thành phần chứa
+        trạm cơ sở) được nối theo cây khung nhỏ nhất của chúng: cặp điểm gần nhất giữa hai tập điểm luôn là một
+        cạnh Delaunay, nên chỉ cần xét các cạnh Delaunay nối hai thành phần khác nhau. Để tam giác hóa nhanh, mỗi ô
+        lưới cạnh com_range / 4 chỉ giữ một điểm đại diện cho mỗi thành phần (cây khung chỉ sai lệch tối đa một
+        đường chéo ô). Trên mỗi cạnh của cây khung, các nút chuyển tiếp cách nhau spacing * com_range.
+        :param nodes: mảng (N, 2) tọa độ các nút
+        :return: mảng (N + R, 2) tọa độ các nút, R nút chuyển tiếp nằm cuối
+        """
+        nb_components, labels = connected_components(self.link_graph(nodes), directed=False)
+        if nb_components == 1:
+            return nodes
+        points = np.vstack([nodes, self.base_station])
+        cells = np.floor(points / (self.com_range / 4)).astype(np.int64)
+        _, keep = np.unique(np.column_stack([labels, cells]), axis=0, return_index=True)
+        points, labels = points[keep], labels[keep]
+        if len(points) < 4:
+            a, b = np.triu_indices(len(points), k=1)
+        else:
+            simplices = Delaunay(points).simplices
+            edges = np.vstack([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]])
+            a, b = edges[:, 0], edges[:, 1]
+        cross = labels[a] != labels[b]
+        a, b = a[cross], b[cross]
+        length = np.sqrt(np.sum((points[a] - points[b]) ** 2, axis=1))
+        # Cạnh ngắn nhất giữa mỗi cặp thành phần.
+        low, high = np.minimum(labels[a], labels[b]), np.maximum(labels[a], labels[b])
+        pair = low * nb_components + high
+        order = np.lexsort((length, pair))
+        keys, first = np.unique(pair[order], return_index=True)
+        best = order[first]
+        tree = minimum_spanning_tree(coo_matrix((length[best], (low[best], high[best])),
+                                                shape=(nb_components, nb_components))).tocoo()
+        chosen = best[np.searchsorted(keys, np.minimum(tree.row, tree.col) * nb_components +
+                                      np.maximum(tree.row, tree.col))]
+        a, b, d = points[a[chosen]], points[b[chosen]], length[chosen]
+        counts = np.ceil(d / (self.spacing * self.com_range)).astype(np.int64) - 1
+        owner = np.repeat(np.arange(len(chosen)), counts)
+        step = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+        ratio = (step / (counts[owner] + 1))[:, None]
+        relays = a[owner] + (b[owner] - a[owner]) * ratio
+        return np.vstack([nodes, relays])
+
+    def place_targets(self, nodes):
+        """
+        Mỗi mục tiêu được đặt ngẫu nhiên trong sen_range của một nút ngẫu nhiên, nên luôn có nút cảm biến được.
+        """
+        owner = self.rng.integers(0, len(nodes), size=self.nb_targets)
+        radius = self.sen_range * np.sqrt(self.rng.uniform(0, 1, size=self.nb_targets))
+        angle = self.rng.uniform(0, 2 * np.pi, size=self.nb_targets)
+        targets = nodes[owner] + radius[:, None] * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+        # Giữ mục tiêu trong vùng triển khai nhưng vẫn trong sen_range của nút sở hữu.
+        inside = np.all((targets >= 0) & (targets <= self.size), axis=1)
+        targets[~inside] = nodes[owner[~inside]]
+        return targets
+
+    def estimate_energy(self, nodes, targets):
+        """
+        Ước lượng năng lượng tiêu thụ mỗi giây của từng nút trên cây định tuyến như RoutingTree: mức của nút là
+        số bước nhảy tối thiểu tới trạm cơ sở, nút nhận là hàng xóm gần nhất có mức thấp hơn. Mỗi giây nút gửi
+        prob_gp gói tin cho mỗi mục tiêu nó cảm biến được và chuyển tiếp mọi gói tin của cây con.
+        :return: mảng (N,) năng lượng tiêu thụ mỗi giây
+        """
+        spe = self.phy_spe
+        n = len(nodes)
+        graph = self.link_graph(nodes)
+        level = shortest_path(graph, directed=False, unweighted=True, indices=n)[:n]
+        reachable = np.isfinite(level)
+        level = np.where(reachable, level, -1).astype(np.int64)
+
+        graph = (graph + graph.T).tocoo()
+        between = (graph.row < n) & (graph.col < n)
+        rows, cols = graph.row[between], graph.col[between]
+        valid = reachable[rows] & reachable[cols] & (level[cols] < level[rows])
+        rows, cols = rows[valid], cols[valid]
+        distance = np.sqrt(np.sum((nodes[rows] - nodes[cols]) ** 2, axis=1))
+        order = np.lexsort((cols, distance, rows))
+        rows, cols, distance = rows[order], cols[order], distance[order]
+        senders, first = np.unique(rows, return_index=True)
+        parent = np.full(n, -1, dtype=np.int64)
+        parent_distance = np.zeros(n)
+        parent[senders] = cols[first]
+        parent_distance[senders] = distance[first]
+        direct = level == 1
+        parent[direct] = n
+        parent_distance[direct] = np.sqrt(np.sum((nodes[direct] - self.base_station) ** 2, axis=1))
+
+        own = spe["prob_gp"] * cKDTree(targets).query_ball_point(nodes, self.sen_range, return_length=True)
+        load = own.astype(np.float64)
+        # Cộng dồn tải từ mức sâu nhất lên, mỗi lần một mức.
+        order = np.argsort(-level, kind="stable")
+        bounds = np.flatnonzero(np.diff(level[order])) + 1
+        for rows in np.split(order, bounds):
+            if level[rows[0]] > 1:
+                np.add.at(load, parent[rows], load[rows])
+
+        d0 = math.sqrt(spe["efs"] / spe["emp"])
+        send = np.where(parent_distance <= d0, spe["et"] + spe["efs"] * parent_distance ** 2,
+                        spe["et"] + spe["emp"] * parent_distance ** 4)
+        energy = spe["package_size"] * (load * send + (load - own) * spe["er"])
+        return np.where(parent >= 0, energy, 0.0)
+
+    def generate(self):
+        """
+        :return: dict kịch bản cùng các khóa với tệp YAML, các danh sách tọa độ là mảng NumPy
+        """
+        nodes = self.connect(self.place_nodes())
+        targets = self.place_targets(nodes[:self.nb_nodes])
+        return {
+            "node_phy_spe": self.phy_spe,
+            "seed": self.seed,
+            "max_time": self.max_time,
+            "Rc": self.com_range,
+            "Rs": self.sen_range,
+            "base_station": [float(self.base_station[0]), float(self.base_station[1])],
+            "xllcorner": self.xllcorner,
+            "yllcorner": self.yllcorner,
+            "nodes": nodes,
+            "targets": targets,
+            "energy_avg": self.estimate_energy(nodes, targets),
+        }
+
+
+def format_points(points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return "".join("- - {:.9f}\n  - {:.9f}\n".format(x, y) for x, y in points.tolist())
+
+
+def write_scenario(scenario, path):
+    """
+    Ghi kịch bản ra tệp YAML theo thứ tự khóa của các kịch bản có sẵn. Các danh sách tọa độ được định dạng
+    trực tiếp thay vì qua yaml.dump (chậm với hàng trăm nghìn nút); số thực luôn có dấu chấm thập phân để
+    yaml.safe_load đọc lại đúng kiểu.
+    :param scenario: dict kịch bản (xem ScenarioGenerator.generate)
+    :param path: đường dẫn tệp YAML
+    """
+    header = {key: value for key, value in scenario.items() if key not in ("nodes", "targets", "energy_avg")}
+    tmp = "{}.tmp{}".format(path, os.getpid())
+    with open(tmp, 'w') as file:
+        file.write(yaml.safe_dump(header, sort_keys=False, default_flow_style=False))
+        file.write("nodes:\n")
+        file.write(format_points(scenario["nodes"]))
+        file.write("targets:\n")
+        file.write(format_points(scenario["targets"]))
+        file.write("\nenergy_avg:\n")
+        file.write("".join("-  {:.12e}\n".format(value) for value in np.asarray(scenario["energy_avg"]).tolist()))
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sinh kịch bản mạng tổng hợp cùng lược đồ với network_scenarios.")
+    parser.add_argument("nb_nodes", type=int)
+    parser.add_argument("-o", "--output", default=None,
+                        help="tệp YAML; mặc định là network_scenarios/<layout><nb_nodes>_s<seed>.yaml")
+    parser.add_argument("--targets", type=int, default=None)
+    parser.add_argument("--layout", default="uniform", choices=LAYOUTS)
+    parser.add_argument("--size", type=float, default=None)
+    parser.add_argument("--degree", type=float, default=8.0)
+    parser.add_argument("--base-station", type=float, nargs=2, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clusters", type=int, default=None)
+    parser.add_argument("--spread", type=float, default=None)
+    parser.add_argument("--roads", type=int, default=None)
+    parser.add_argument("--jitter", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    generator = ScenarioGenerator(args.nb_nodes, nb_targets=args.targets, layout=args.layout, size=args.size,
+                                  degree=args.degree, base_station=args.base_station, seed=args.seed,
+                                  nb_clusters=args.clusters, spread=args.spread, nb_roads=args.roads,
+                                  jitter=args.jitter)
+    scenario = generator.generate()
+    path = args.output or os.path.join(os.path.dirname(__file__), "network_scenarios",
+                                       "{}{}_s{}.yaml".format(args.layout, args.nb_nodes, args.seed))
+    write_scenario(scenario, path)
+    print("{}: {} nodes ({} relays), {} targets, area {:.0f}x{:.0f}".format(
+        path, len(scenario["nodes"]), len(scenario["nodes"]) - args.nb_nodes, len(scenario["targets"]),
+        generator.size, generator.size))
+
+
+if __name__ == "__main__":
+    main()
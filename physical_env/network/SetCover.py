@@ -0,0 +1,56 @@
+import heapq
+
+
+class DisjointSetCover:
+    """
+    Phủ tập tham lam, chia các nút thành các nhóm rời nhau từ danh sách các nhóm ứng viên
+    (mỗi nhóm là tập các đường tròn chứa một giao điểm).
+    Mỗi bước chọn nhóm còn lại nhiều nút chưa được phủ nhất (bằng nhau thì chọn nhóm đứng trước),
+    loại các nút đó khỏi các nhóm khác. Kích thước còn lại của các nhóm được giữ trong một max-heap
+    và chỉ cập nhật khi nhóm được lấy ra khỏi heap (lazy).
+    """
+
+    def __init__(self, groups):
+        """
+        :param groups: danh sách các nhóm ứng viên (list các chỉ số nút), có thể trùng nhau
+        """
+        self.groups = self.unique(groups)
+
+    @staticmethod
+    def unique(groups):
+        """
+        Loại các nhóm trùng nhau, giữ thứ tự xuất hiện đầu tiên.
+        :return: danh sách các frozenset
+        """
+        seen = set()
+        unique_groups = []
+        for group in groups:
+            key = frozenset(group)
+            if key not in seen:
+                seen.add(key)
+                unique_groups.append(key)
+        return unique_groups
+
+    def partition(self, nb_nodes=0):
+        """
+        :param nb_nodes: số nút của mạng; các nút không thuộc nhóm nào trở thành một nhóm riêng
+        :return: danh sách các nhóm rời nhau (list tăng dần), theo thứ tự được chọn,
+                 sau đó là các nhóm một nút theo thứ tự chỉ số
+        """
+        covered = set()
+        heap = [(-len(group), position) for position, group in enumerate(self.groups) if group]
+        heapq.heapify(heap)
+        result = []
+        while heap:
+            size, position = heapq.heappop(heap)
+            remaining = self.groups[position] - covered
+            if not remaining:
+                continue
+            if len(remaining) < -size:
+                heapq.heappush(heap, (-len(remaining), position))
+                continue
+            covered |= remaining
+            result.append(sorted(remaining))
+
+        result.extend([node] for node in range(nb_nodes) if node not in covered)
+        return result
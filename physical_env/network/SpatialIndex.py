@@ -0,0 +1,95 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class SpatialIndex:
+    """
+    Chỉ mục không gian (KD-tree) dùng chung cho cả mạng. Trả lời một lần cho tất cả các nút
+    các truy vấn theo com_range (hàng xóm), sen_range (mục tiêu) và phạm vi của trạm cơ sở.
+    Kết quả lưu dưới dạng CSR: các chỉ số của nút i nằm trong indices[indptr[i]:indptr[i + 1]],
+    sắp xếp tăng dần như thứ tự duyệt listNodes/listTargets.
+    """
+
+    def __init__(self, node_locations, com_ranges, sen_ranges, target_locations, base_location):
+        """
+        :param node_locations: mảng (N, 2) tọa độ các nút
+        :param com_ranges: mảng (N,) bán kính truyền thông của từng nút
+        :param sen_ranges: mảng (N,) bán kính cảm biến của từng nút
+        :param target_locations: mảng (M, 2) tọa độ các mục tiêu
+        :param base_location: tọa độ trạm cơ sở
+        """
+        self.node_locations = np.asarray(node_locations, dtype=np.float64).reshape(-1, 2)
+        self.target_locations = np.asarray(target_locations, dtype=np.float64).reshape(-1, 2)
+        self.base_location = np.asarray(base_location, dtype=np.float64)
+        self.com_ranges = np.asarray(com_ranges, dtype=np.float64)
+        self.sen_ranges = np.asarray(sen_ranges, dtype=np.float64)
+        self.nb_nodes = len(self.node_locations)
+        self.node_tree = cKDTree(self.node_locations)
+        self.target_tree = cKDTree(self.target_locations)
+
+        self.neighbor_indptr, self.neighbor_indices, self.neighbor_distances = self._probe_neighbors()
+        self.target_indptr, self.target_indices = self._probe_targets()
+        self.direct_nodes = self._probe_base_station()
+
+    @staticmethod
+    def _distance(a, b):
+        return np.sqrt(np.sum((a - b) ** 2, axis=-1))
+
+    @staticmethod
+    def _max_range(ranges):
+        if len(ranges) == 0:
+            return 0.0
+        # Nới bán kính một chút, điều kiện chính xác được kiểm tra lại bằng khoảng cách thật.
+        return float(np.max(ranges)) * (1 + 1e-9) + 1e-9
+
+    def _to_csr(self, rows, cols, nb_rows, values=None):
+        order = np.lexsort((cols, rows))
+        rows, cols = rows[order], cols[order]
+        indptr = np.zeros(nb_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=nb_rows), out=indptr[1:])
+        if values is None:
+            return indptr, cols.astype(np.int64)
+        return indptr, cols.astype(np.int64), values[order]
+
+    def _probe_neighbors(self):
+        pairs = self.node_tree.query_pairs(r=self._max_range(self.com_ranges), output_type='ndarray')
+        i, j = pairs[:, 0], pairs[:, 1]
+        d = self._distance(self.node_locations[i], self.node_locations[j])
+        # j là hàng xóm của i nếu nằm trong com_range của i (và ngược lại).
+        forward = d <= self.com_ranges[i]
+        backward = d <= self.com_ranges[j]
+        rows = np.concatenate((i[forward], j[backward]))
+        cols = np.concatenate((j[forward], i[backward]))
+        return self._to_csr(rows, cols, self.nb_nodes, np.concatenate((d[forward], d[backward])))
+
+    def _probe_targets(self):
+        if self.nb_nodes == 0 or len(self.target_locations) == 0:
+            return np.zeros(self.nb_nodes + 1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        pairs = self.node_tree.sparse_distance_matrix(self.target_tree, self._max_range(self.sen_ranges),
+                                                      output_type='ndarray')
+        i, j = pairs['i'].astype(np.int64), pairs['j'].astype(np.int64)
+        d = self._distance(self.node_locations[i], self.target_locations[j])
+        inside = d <= self.sen_ranges[i]
+        return self._to_csr(i[inside], j[inside], self.nb_nodes)
+
+    def _probe_base_station(self):
+        if self.nb_nodes == 0:
+            return np.zeros(0, dtype=np.int64)
+        candidates = np.asarray(self.node_tree.query_ball_point(self.base_location, self._max_range(self.com_ranges)),
+                                dtype=np.int64)
+        d = self._distance(self.node_locations[candidates], self.base_location)
+        return np.sort(candidates[d <= self.com_ranges[candidates]])
+
+    def reverse_neighbors(self):
+        """
+        Quan hệ hàng xóm đảo ngược: hàng i chứa các nút nhận i làm hàng xóm.
+        :return: (indptr, indices) dạng CSR
+        """
+        rows = np.repeat(np.arange(self.nb_nodes), np.diff(self.neighbor_indptr))
+        return self._to_csr(self.neighbor_indices, rows, self.nb_nodes)
+
+    def neighbors_of(self, node_id):
+        return self.neighbor_indices[self.neighbor_indptr[node_id]:self.neighbor_indptr[node_id + 1]]
+
+    def targets_of(self, node_id):
+        return self.target_indices[self.target_indptr[node_id]:self.target_indptr[node_id + 1]]
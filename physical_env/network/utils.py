@@ -1,6 +1,10 @@
+import hashlib
+import itertools
 import numpy as np
 from scipy.spatial.distance import euclidean
 from scipy.spatial import distance
+from scipy.spatial import cKDTree
+from physical_env.network.SetCover import DisjointSetCover
 from sklearn.cluster import KMeans
 
 from matplotlib import pyplot as plt
@@ -10,70 +14,97 @@ import numpy as np
 from math import sqrt
 
 def find_receiver(node):
-    if not (node.status == 1):
-        return -1
-    candidates = [other_node for other_node in node.neighbors
-                  if other_node.level < node.level and other_node.status == 1]
-
-    if len(candidates) > 0:
-        distances = [euclidean(candidate.location, node.location) for candidate in candidates]
-        return candidates[np.argmin(distances)].id
-    else:
+    receiver = node.find_receiver()
+    if receiver is None:
         return -1
+    return receiver.id
 
 def request_function(node, optimizer, t):
     optimizer.list_request.append(
         {"id": node.id, "energy": node.energy, "energyCS": node.energyCS, "energyRR": node.energyRR,
-         "time": t})
+         "time": t, "threshold": node.threshold})
+
+class ClusterLayout:
+    """
+    Kết quả phân cụm của mạng: vị trí sạc của từng cụm (vị trí cuối cùng là trạm cơ sở),
+    danh sách nút của từng cụm và chỉ mục ngược nút -> cụm.
+    Kết quả được ghi nhớ theo mã băm của tọa độ, bán kính sạc của các nút và vị trí trạm cơ sở,
+    nên network_clustering và network_cluster_id_node chỉ phân cụm một lần.
+    """
+    _cache = {}
+    _cache_size = 16
+
+    def __init__(self, location_nodes, radius_nodes, base_location):
+        """
+        :param location_nodes: mảng (N, 2) tọa độ các nút
+        :param radius_nodes: mảng (N,) bán kính sạc của các nút
+        :param base_location: tọa độ trạm cơ sở
+        """
+        set_arr_interecting_circles = find_set_of_interecting_circles(location_nodes, radius_nodes)
+        set_arr_interecting_circles = remove_arr_of_set(set_arr_interecting_circles)
+        set_arr_interecting_circles = remove_common_elements2(set_arr_interecting_circles, list(location_nodes))
+        self.members = set_arr_interecting_circles
+        self._index_members()
+
+        self.charging_pos = []
+        for centers in self.members:
+            circles = [Point(location_nodes[i]).buffer(radius_nodes[i]) for i in centers]
+            intersections = circles[0]
+            for circle in circles[1:]:
+                intersections = intersections.intersection(circle)
+
+            if isinstance(intersections, Polygon) and not intersections.is_empty:
+                centroid = intersections.centroid
+                self.charging_pos.append((centroid.x, centroid.y))
+            else:
+                self.charging_pos.append((location_nodes[centers[0]][0], location_nodes[centers[0]][1]))
+        self.charging_pos.append(base_location)
+
+    def _index_members(self):
+        self.node_cluster = {}
+        for id_cluster, centers in enumerate(self.members):
+            for id_node in centers:
+                self.node_cluster.setdefault(id_node, id_cluster)
+
+    @classmethod
+    def from_parts(cls, charging_pos, members):
+        """
+        Dựng lại ClusterLayout từ kết quả đã lưu, không phân cụm lại.
+        :param charging_pos: danh sách vị trí sạc (vị trí cuối cùng là trạm cơ sở)
+        :param members: danh sách nút của từng cụm
+        """
+        layout = cls.__new__(cls)
+        layout.charging_pos = list(charging_pos)
+        layout.members = [list(centers) for centers in members]
+        layout._index_members()
+        return layout
+
+    @classmethod
+    def of(cls, network):
+        """
+        :return: ClusterLayout của mạng với bán kính sạc hiện tại (dùng lại nếu đã tính)
+        """
+        location_nodes = np.ascontiguousarray(network.state.location, dtype=np.float64)
+        radius_nodes = np.ascontiguousarray(network.state.radius, dtype=np.float64)
+        base_location = np.asarray(network.baseStation.location, dtype=np.float64)
+        key = hashlib.sha1(location_nodes.tobytes() + radius_nodes.tobytes() + base_location.tobytes()).hexdigest()
+        layout = cls._cache.get(key)
+        if layout is None:
+            if len(cls._cache) >= cls._cache_size:
+                cls._cache.clear()
+            layout = cls(location_nodes.copy(), radius_nodes.copy(), network.baseStation.location)
+            cls._cache[key] = layout
+        return layout
+
+    def cluster_of(self, id_node):
+        return self.node_cluster.get(id_node)
+
 
 def network_cluster_id_node(network = None):
-    nodes = network.listNodes
-    location_nodes = []
-    radius_nodes = []
-    for node in nodes:
-        radius_nodes.append(node.radius)
-        location_nodes.append(node.location)
-
-    set_arr_interecting_circles = find_set_of_interecting_circles(location_nodes, radius_nodes)
-    set_arr_interecting_circles = remove_arr_of_set(set_arr_interecting_circles)
-    set_arr_interecting_circles = remove_common_elements2(set_arr_interecting_circles, location_nodes)
-    arr_name_nodes = set_arr_interecting_circles
-    return arr_name_nodes
+    return [list(centers) for centers in ClusterLayout.of(network).members]
 
 def network_clustering(network=None):
-    nodes = network.listNodes
-    location_nodes = []
-    radius_nodes = []
-    for node in nodes:
-        radius_nodes.append(node.radius)
-        location_nodes.append(node.location)
-
-    set_arr_interecting_circles = find_set_of_interecting_circles(location_nodes, radius_nodes)
-    set_arr_interecting_circles = remove_arr_of_set(set_arr_interecting_circles)
-    set_arr_interecting_circles = remove_common_elements2(set_arr_interecting_circles, location_nodes)
-    arr_name_nodes = set_arr_interecting_circles
-
-    all_intersections = []
-    charging_pos = []
-    for centers in arr_name_nodes:
-        circles = []
-        for i in centers:
-            circle = Point(location_nodes[i]).buffer(radius_nodes[i])
-            circles.append(circle)
-
-        intersections = circles[0]
-        for circle in circles[1:]:
-            intersections = intersections.intersection(circle)
-
-        if isinstance(intersections, Polygon) and not intersections.is_empty:
-            centroid = intersections.centroid
-            charging_pos.append((centroid.x, centroid.y))
-        else:
-            charging_pos.append((location_nodes[centers[0]][0], location_nodes[centers[0]][1]))
-        all_intersections.append(intersections)
-
-    charging_pos.append(network.baseStation.location)
-    return charging_pos
+    return list(ClusterLayout.of(network).charging_pos)
 
 def node_distribution_plot(network, charging_pos):
     x_node = []
@@ -115,48 +146,147 @@ def remove_element_in_arr(arr, key):
       arr.pop(i)
       break
 
-def find_set_of_interecting_circles(centers, radius):
-  intersections = set()
-  for i in range(len(centers)):
-    for j in range(len(centers)):
-      if (j != i):
-        d = np.sqrt((centers[j][0] - centers[i][0])**2 + (centers[j][1] - centers[i][1])**2)
-
-        a = (radius[i]**2 - radius[j]**2 + d**2) / (2 * d)
-        h = np.sqrt(radius[i]**2 - a**2)
-        
-        x_intersect1 = centers[i][0] + a * (centers[j][1] - centers[i][0]) / d
-        y_intersect1 = centers[i][1] + a * (centers[j][1] - centers[i][1]) / d
-        x_intersect2 = x_intersect1 + h * (centers[j][1] - centers[i][1]) / d
-        y_intersect2 = y_intersect1 - h * (centers[j][1] - centers[i][0]) / d
-        intersections.add((x_intersect1, y_intersect1))
-        intersections.add((x_intersect2, y_intersect2))
-
-
-  set_points_in_circles = []
-  for point in intersections:
-    point_in_circles = []
-    for i in range(len(centers)):
-      if np.sqrt((point[0] - centers[i][0])**2 + (point[1] - centers[i][1])**2) <= radius[i] + 0.01:
-        point_in_circles.append(i)
-    set_points_in_circles.append(point_in_circles)
+def _intersection_points(centers, radius, i, j, second=False):
+  """
+  Giao điểm của các cặp đường tròn (i, j) theo đúng công thức cũ.
+  :param second: False trả về điểm thứ nhất của mọi cặp, True trả về điểm thứ hai (chỉ khi h xác định)
+  :return: mảng (M, 2) các điểm hữu hạn
+  """
+  d = np.sqrt((centers[j, 0] - centers[i, 0])**2 + (centers[j, 1] - centers[i, 1])**2)
+  # Cặp trùng tâm cho phép chia cho 0 ở cách tính cũ (điểm NaN/inf), bỏ luôn.
+  valid = (i != j) & (d > 0)
+  i, j, d = i[valid], j[valid], d[valid]
+  a = (radius[i]**2 - radius[j]**2 + d**2) / (2 * d)
+  x_intersect = centers[i, 0] + a * (centers[j, 1] - centers[i, 0]) / d
+  y_intersect = centers[i, 1] + a * (centers[j, 1] - centers[i, 1]) / d
+  if second:
+    with np.errstate(invalid='ignore'):
+      h = np.sqrt(radius[i]**2 - a**2)
+    # Hai đường tròn không cắt nhau (h là NaN): không có điểm thứ hai.
+    crossing = np.isfinite(h)
+    h, d, i, j = h[crossing], d[crossing], i[crossing], j[crossing]
+    x_intersect = x_intersect[crossing] + h * (centers[j, 1] - centers[i, 1]) / d
+    y_intersect = y_intersect[crossing] - h * (centers[j, 1] - centers[i, 0]) / d
+  points = np.stack((x_intersect, y_intersect), axis=1)
+  return points[np.all(np.isfinite(points), axis=1)]
+
+def find_set_of_interecting_circles(centers, radius, chunk_size=256):
+  """
+  Tìm các giao điểm của từng cặp đường tròn (tâm là nút, bán kính là bán kính sạc) và với mỗi
+  giao điểm, tập các đường tròn chứa nó.
+  Giữ nguyên tập điểm của cách tính cũ: mọi cặp có thứ tự (i, j) đều cho điểm thứ nhất, kể cả khi
+  hai đường tròn không cắt nhau; điểm thứ hai chỉ có khi h xác định, tức chỉ với các cặp cách nhau
+  không quá |r_i| + |r_j| (lấy bằng cKDTree.query_pairs). Điểm thứ nhất của mọi cặp được tính theo
+  từng khối hàng i, và các điểm không nằm trong ô lưới nào bị các đường tròn phủ được loại ngay,
+  trước khi gộp trùng; các điểm đó không thuộc đường tròn nào và chỉ cho tập rỗng.
+  Chi phí: O(n^2) phép tính số học cho điểm thứ nhất; phần kiểm tra điểm thuộc đường tròn chỉ làm
+  trên các điểm còn lại.
+  :param chunk_size: số đường tròn i được xử lý trong một khối
+  :return: danh sách các tập chỉ số đường tròn (không trùng nhau), sắp xếp giảm dần theo kích thước
+  """
+  centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+  radius = np.asarray(radius, dtype=np.float64)
+  n = len(centers)
+  if n < 2:
+    return []
+
+  # Lưới phủ: một ô được đánh dấu nếu hình vuông bao của một đường tròn (bán kính r + 0.01, không âm)
+  # chạm vào nó. Điểm nằm ngoài mọi ô đánh dấu chắc chắn không thuộc đường tròn nào.
+  reach = np.flatnonzero(radius + 0.01 >= 0)
+  reach_radius = radius[reach] + 0.01 + 1e-6
+  if len(reach):
+    origin = np.min(centers[reach] - reach_radius[:, None], axis=0)
+    extent = np.max(centers[reach] + reach_radius[:, None], axis=0) - origin
+  else:
+    origin, extent = np.zeros(2), np.zeros(2)
+  # Ô cạnh bằng bán kính lớn nhất, nhưng lưới không quá 2048 ô mỗi chiều.
+  cell = max(float(np.max(reach_radius, initial=0.0)), float(np.max(extent)) / 2048, 1e-3)
+  shape = np.floor(extent / cell).astype(np.int64) + 1
+  covered = np.zeros(shape, dtype=bool)
+  low = np.floor((centers[reach] - reach_radius[:, None] - origin) / cell).astype(np.int64)
+  high = np.floor((centers[reach] + reach_radius[:, None] - origin) / cell).astype(np.int64)
+  for dx in range(int(np.max(high[:, 0] - low[:, 0], initial=0)) + 1):
+    for dy in range(int(np.max(high[:, 1] - low[:, 1], initial=0)) + 1):
+      inside = (low[:, 0] + dx <= high[:, 0]) & (low[:, 1] + dy <= high[:, 1])
+      covered[low[inside, 0] + dx, low[inside, 1] + dy] = True
+
+  pruned = [False]
+
+  def keep(points):
+    # Trả về các điểm rơi vào ô được phủ, đã làm tròn và gộp trùng (dạng số phức để sắp xếp theo
+    # (x, y) trên mảng một chiều); ghi nhận nếu có điểm bị loại.
+    index = np.floor((points - origin) / cell)
+    hit = np.all((index >= 0) & (index < shape), axis=1)
+    index = index[hit].astype(np.int64)
+    hit[hit] = covered[index[:, 0], index[:, 1]]
+    if not np.all(hit):
+      pruned[0] = True
+    # Làm tròn để các giao điểm trùng nhau (sai khác do làm tròn số thực) chỉ được tính một lần.
+    points = np.round(points[hit], 6)
+    return unique(points[:, 0] + 1j * points[:, 1])
+
+  def unique(values):
+    # np.sort trên số phức (thứ tự theo (x, y)) rồi bỏ phần tử lặp nhanh hơn nhiều so với np.unique.
+    values = np.sort(values)
+    fresh = np.ones(len(values), dtype=bool)
+    fresh[1:] = values[1:] != values[:-1]
+    return values[fresh]
+
+  chunks = []
+  for start in range(0, n, chunk_size):
+    i = np.repeat(np.arange(start, min(start + chunk_size, n)), n)
+    j = np.tile(np.arange(n), len(i) // n)
+    chunks.append(keep(_intersection_points(centers, radius, i, j)))
+  # Điểm thứ hai chỉ có khi h xác định, nên chỉ cần các cặp đủ gần nhau.
+  size = np.abs(radius)
+  pairs = cKDTree(centers).query_pairs(2 * float(np.max(size)) + 1e-6, output_type='ndarray')
+  close = np.sqrt(np.sum((centers[pairs[:, 0]] - centers[pairs[:, 1]])**2, axis=1)) \
+      <= size[pairs[:, 0]] + size[pairs[:, 1]] + 1e-6
+  pairs = pairs[close]
+  i = np.concatenate((pairs[:, 0], pairs[:, 1]))
+  j = np.concatenate((pairs[:, 1], pairs[:, 0]))
+  chunks.append(keep(_intersection_points(centers, radius, i, j, second=True)))
+  points = unique(np.concatenate(chunks))
+  points = np.stack((points.real, points.imag), axis=1)
+  if len(points) == 0:
+    return [[]] if pruned[0] else []
+
+  # Truy vấn theo từng đường tròn với đúng bán kính của nó, rồi sắp xếp theo (điểm, đường tròn).
+  # Đường tròn bán kính âm (nút tiêu thụ ít, bán kính sạc < 0) không chứa điểm nào.
+  members = cKDTree(points).query_ball_point(centers[reach], radius[reach] + 0.01, return_sorted=False)
+  lengths = np.fromiter((len(member) for member in members), dtype=np.int64, count=len(reach))
+  keys = np.fromiter(itertools.chain.from_iterable(members), dtype=np.int64, count=int(np.sum(lengths)))
+  keys = keys * n + np.repeat(reach, lengths)
+  keys.sort()
+  point_ids, circle_ids = keys // n, keys % n
+  counts = np.bincount(point_ids, minlength=len(points))
+  starts = np.cumsum(counts) - counts
+
+  # Mỗi tập đường tròn được đại diện bởi (kích thước, hai tổng băm 64 bit), nên các tập trùng nhau được
+  # loại bằng một lần sắp xếp thay vì duyệt từng điểm; thứ tự giữ theo điểm xuất hiện đầu tiên.
+  weights = np.random.default_rng(0).integers(1, 2**63, size=(2, n), dtype=np.uint64)
+  signature = np.zeros((len(points), 3), dtype=np.uint64)
+  signature[:, 0] = counts
+  # Các khóa đã sắp theo điểm nên tổng của mỗi điểm là một đoạn liền nhau (cộng modulo 2^64).
+  filled = np.flatnonzero(counts)
+  if len(filled):
+    signature[filled, 1] = np.add.reduceat(weights[0, circle_ids], starts[filled])
+    signature[filled, 2] = np.add.reduceat(weights[1, circle_ids], starts[filled])
+  order = np.lexsort(signature.T[::-1])
+  fresh = np.ones(len(order), dtype=bool)
+  fresh[1:] = np.any(signature[order[1:]] != signature[order[:-1]], axis=1)
+  first = np.sort(order[fresh])
+  set_points_in_circles = [circle_ids[starts[p]:starts[p] + counts[p]].tolist() for p in first]
+  # Các điểm bị loại bởi lưới phủ không thuộc đường tròn nào: chúng cho đúng một tập rỗng.
+  if pruned[0] and not np.any(counts == 0):
+    set_points_in_circles.append([])
 
   set_points_in_circles = sorted(set_points_in_circles, key=lambda x: len(x), reverse=True)
 
   return set_points_in_circles
 
 def remove_arr_of_set(set):
-  different = False
-  new_arr = []
-  new_arr.append(set[0])
-  for i in range(1, len(set)):
-    different = False
-    for arr in new_arr:
-      if set[i] == arr:
-        different = True
-    if not different:
-      new_arr.append(set[i])
-  return new_arr
+  return [sorted(group) for group in DisjointSetCover.unique(set)]
 
 def circle_intersection(circle1, circle2):
     x1, y1, r1 = circle1
@@ -197,18 +327,7 @@ def find_intersecting_circles2(centers, radii):
   return count_circle_intersection
 
 def remove_common_elements2(arr, nodes):
-    for i in range(len(arr)-2):
-      arr = sorted(arr, key=lambda x: len(x), reverse=True)
-      first_subarray = arr[i]
-      for num in first_subarray:
-          for subarray in arr[(i+1):]: 
-              if num in subarray:
-                  subarray.remove(num) 
-      arr = sorted(arr, key=lambda x: len(x), reverse=True)
-    arr = [subarray for subarray in arr if subarray]
-
-    find_and_add_alone_circle(arr, nodes)
-    return arr
+    return DisjointSetCover(arr).partition(len(nodes))
 
 def find_nearest_point(d, points):
   nearest_points = []
@@ -226,15 +345,10 @@ def find_nearest_point(d, points):
   return nearest_points
 
 def find_and_add_alone_circle(arr_nodes, nodes):
-  merge_arr_node = []
+  merge_arr_node = set()
   for arr_node in arr_nodes:
-    for node in arr_node:
-      merge_arr_node.append(node)
+    merge_arr_node.update(arr_node)
 
-  arr_node_alone = []
   for i in range(len(nodes)):
-    arr_node_alone = []
     if i not in merge_arr_node:
-      arr_node_alone.append(i)
-    if (len(arr_node_alone) == 1):
-      arr_nodes.append(arr_node_alone)
+      arr_nodes.append([i])
@@ -1,20 +1,30 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+from optimizer.sweep import ALPHA_GAMMAS, ResultStore, scenario_path
+
+# Kết quả đo bằng `python -m optimizer.sweep`; các mảng gõ tay bên dưới chỉ dùng khi kho chưa có đủ kết quả.
+store = ResultStore()
+
+
+def from_store(fallback, categories, **params):
+    lifetimes = store.lifetimes([scenario_path(category) for category in categories], **params)
+    return fallback if lifetimes is None else lifetimes
+
 # Data for the first plot
 categories = ['50', '100', '150', '200']
 targets_monitored = [1, 2, 3, 4]
-q_learning_epsilon_greedy = [15603, 5150, 4000, 1536]
-q_learning_tham_lam = [14300, 4850, 3818, 1521] 
+q_learning_epsilon_greedy = from_store([15603, 5150, 4000, 1536], categories, alpha=0.1, q_gamma=0.1, epsilon=0.01)
+q_learning_tham_lam = from_store([14300, 4850, 3818, 1521], categories, alpha=0.1, q_gamma=0.1, epsilon=0)
 sarsa = [14550, 4950, 3950, 1450]
 # 4865, 
 # Data for the second plot (epsilon values)
-epsilon0 = [14300, 4850, 3800, 1500]
-epsilon001 = [15603, 5150, 4000, 1536]
-epsilon01 = [14900, 4700, 3600, 1500]
-epsilon02 = [14800, 4700, 3600, 1500]
-epsilon03 = [14500, 4700, 3550, 1500]
-epsilon05 = [13200, 4600, 3550, 1450]
+epsilon0 = from_store([14300, 4850, 3800, 1500], categories, alpha=0.1, q_gamma=0.1, epsilon=0)
+epsilon001 = from_store([15603, 5150, 4000, 1536], categories, alpha=0.1, q_gamma=0.1, epsilon=0.01)
+epsilon01 = from_store([14900, 4700, 3600, 1500], categories, alpha=0.1, q_gamma=0.1, epsilon=0.1)
+epsilon02 = from_store([14800, 4700, 3600, 1500], categories, alpha=0.1, q_gamma=0.1, epsilon=0.2)
+epsilon03 = from_store([14500, 4700, 3550, 1500], categories, alpha=0.1, q_gamma=0.1, epsilon=0.3)
+epsilon05 = from_store([13200, 4600, 3550, 1450], categories, alpha=0.1, q_gamma=0.1, epsilon=0.5)
 
 # First plot: Comparison of Q-Learning and Sarsa Methods
 plt.figure(figsize=(10, 6))
@@ -49,7 +59,7 @@ plt.grid(True)
 plt.savefig('effect_of_epsilon_on_network_lifetime.png')
 plt.show()
 
-q_learning_tham_lam = [14300, 4850, 3818, 1534]
+q_learning_tham_lam = from_store([14300, 4850, 3818, 1534], categories, alpha=0.1, q_gamma=0.1, epsilon=0)
 no_charge = [11622, 4603, 3550, 1490]
 plt.figure(figsize=(10, 6))
 plt.plot(targets_monitored, q_learning_epsilon_greedy, marker='o', label='Q-Learning')
@@ -72,6 +82,9 @@ plt.show()
 # Data for alpha and gamma
 # alpha = [15481, 15702, 14941, 14570, 13871, 14621, 14621, 13782, 12695]
 gamma = [15428, 15481, 14787, 14994, 15102, 14718, 14567, 14559, 13479, 13479, 13479,13481, 13481,13489, 13489, 13489, 13489,13489]
+gamma_sweep = [store.lifetimes([scenario_path(50)], alpha=0.1, q_gamma=q_gamma, epsilon=0) for q_gamma in ALPHA_GAMMAS]
+if all(lifetime is not None for lifetime in gamma_sweep):
+    gamma = [lifetime[0] for lifetime in gamma_sweep]
 # 4873,  4860, 4882, 4803, 4823, 4797, 4790,  4777, 4777, 4777, 
 
 # Categories for alpha and gamma